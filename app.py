@@ -1,18 +1,58 @@
 # app.py
 
-from flask import Flask, request
-from flask_restx import Api, Resource
+import csv
+import hashlib
+import io
+import json
+import re
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from functools import wraps
+from itertools import islice
+
+from flask import Flask, Response, current_app, request, stream_with_context
+from flask_restx import Api, Namespace, Resource, abort
 from flask_sqlalchemy import SQLAlchemy
-from marshmallow import Schema, fields
+from marshmallow import ValidationError, fields
+from sqlalchemy import bindparam, event, select, text
+from sqlalchemy.orm import joinedload
+from werkzeug.local import LocalProxy
+
+from cache import LRUCache, NullCache, SharedCache
+from coalescer import WriteCoalescer
+from config import get_config
+from instrumentation import TimedSchema, init_instrumentation
+from ranking import RatingIndex
+
+db = SQLAlchemy()
+movie_ns = Namespace('movies')
+director_ns = Namespace('directors')
+genre_ns = Namespace('genres')
+stats_ns = Namespace('stats')
+cache = LocalProxy(lambda: current_app.extensions['response_cache'])
+rating_index = LocalProxy(lambda: current_app.extensions['rating_index'])
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+BULK_BATCH_SIZE = 10_000
+EXPORT_BATCH_SIZE = 1000
+DEFAULT_TOP_SIZE = 10
 
 
 class Movie(db.Model):
     __tablename__ = 'movie'
+    # составные индексы (поле фильтра, id) позволяют отдавать страницу
+    # по курсору after_id без сканирования таблицы
+    __table_args__ = (
+        db.Index('ix_movie_director_id_id', 'director_id', 'id'),
+        db.Index('ix_movie_genre_id_id', 'genre_id', 'id'),
+        db.Index('ix_movie_year_id', 'year', 'id'),
+        db.Index('ix_movie_rating_id', 'rating', 'id'),
+        # min/max рейтинга по году для триггеров movie_stats; жанр и режиссёр
+        # обслуживают индексы (genre_id/director_id, rating DESC, id) ниже
+        db.Index('ix_movie_year_rating', 'year', 'rating'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255))
     description = db.Column(db.String(255))
@@ -23,6 +63,15 @@ class Movie(db.Model):
     genre = db.relationship("Genre")
     director_id = db.Column(db.Integer, db.ForeignKey("director.id"))
     director = db.relationship("Director")
+    # растёт на каждом изменении; PUT/PATCH с "version" в теле применяются,
+    # только если фильм с тех пор не меняли, иначе 409
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+
+# порядок ranking_rows (rating DESC, id): «лучшие» читаются из индекса без сортировки группы
+db.Index('ix_movie_rating_desc_id', Movie.rating.desc(), Movie.id)
+db.Index('ix_movie_genre_id_rating_desc_id', Movie.genre_id, Movie.rating.desc(), Movie.id)
+db.Index('ix_movie_director_id_rating_desc_id', Movie.director_id, Movie.rating.desc(), Movie.id)
 
 class Director(db.Model):
     __tablename__ = 'director'
@@ -36,6 +85,860 @@ class Genre(db.Model):
     name = db.Column(db.String(255))
 
 
+# сводка по фильмам в разрезе жанра, режиссёра и года; ведётся триггерами на movie,
+# поэтому /stats/* читают O(групп) строк вместо GROUP BY по всей таблице
+class MovieStats(db.Model):
+    __tablename__ = 'movie_stats'
+    dimension = db.Column(db.String(16), primary_key=True)
+    key = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    movies = db.Column(db.Integer, nullable=False)
+    rated = db.Column(db.Integer, nullable=False)
+    rating_sum = db.Column(db.Float, nullable=False)
+    rating_min = db.Column(db.Float)
+    rating_max = db.Column(db.Float)
+
+
+STATS_DIMENSIONS = {'genres': 'genre_id', 'directors': 'director_id', 'years': 'year'}
+
+
+class DirectorSchema(TimedSchema):
+    id = fields.Int(dump_only=True)
+    name = fields.Str()
+
+
+class GenreSchema(TimedSchema):
+    id = fields.Int(dump_only=True)
+    name = fields.Str()
+
+
+class MovieSchema(TimedSchema):
+    id = fields.Int(dump_only=True)
+    title = fields.Str()
+    description = fields.Str()
+    trailer = fields.Str()
+    year = fields.Int()
+    rating = fields.Float()
+    genre_id = fields.Int()
+    director_id = fields.Int()
+    version = fields.Int(dump_only=True)
+    director = fields.Nested(DirectorSchema, dump_only=True)
+    genre = fields.Nested(GenreSchema, dump_only=True)
+
+
+EMBEDDABLE = ('director', 'genre')
+
+movie_schema = MovieSchema(exclude=EMBEDDABLE)
+movies_schema = MovieSchema(many=True, exclude=EMBEDDABLE)
+director_schema = DirectorSchema()
+directors_schema = DirectorSchema(many=True)
+genre_schema = GenreSchema()
+genres_schema = GenreSchema(many=True)
+
+
+def create_cache(config):
+    # общий кэш нужен, когда воркеров несколько: иначе запись в одном
+    # не сбросит кэш остальных раньше, чем истечёт TTL
+    if config['CACHE_REDIS_URL']:
+        import redis
+        return SharedCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), config['CACHE_TTL'])
+    if config['CACHE_LOCAL']:
+        return LRUCache(config['CACHE_MAX_ENTRIES'], config['CACHE_TTL'])
+    # ETag по-прежнему считается от свежего тела, так что 304 остаётся верным
+    return NullCache()
+
+
+def set_sqlite_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return on_connect
+
+
+def create_app(config=None, **overrides):
+    app = Flask(__name__)
+    app.config.from_object(config or get_config())
+    app.config.update(overrides)
+    db.init_app(app)
+    api = Api(app)
+    for ns in (movie_ns, director_ns, genre_ns, stats_ns):
+        api.add_namespace(ns)
+    app.extensions['response_cache'] = create_cache(app.config)
+    app.cli.command('create-indexes')(create_indexes)
+    with app.app_context():
+        app.extensions['rating_index'] = RatingIndex(
+            ranking_rows,
+            database=db.engine.url.database if db.engine.dialect.name == 'sqlite' else None,
+            top_k=app.config['RATING_INDEX_TOP_K'],
+            max_groups=app.config['RATING_INDEX_MAX_GROUPS'],
+        )
+        if db.engine.dialect.name == 'sqlite' and app.config['SQLITE_PRAGMAS']:
+            event.listen(db.engine, 'connect', set_sqlite_pragmas(app.config['SQLITE_PRAGMAS']))
+        if app.config['INSTRUMENTATION']:
+            init_instrumentation(app, db.engine)
+    if app.config['WRITE_COALESCING']:
+        app.extensions['movie_writer'] = WriteCoalescer(
+            app, apply_movie_updates,
+            window=app.config['WRITE_COALESCE_WINDOW_MS'] / 1000,
+            max_batch=app.config['WRITE_COALESCE_MAX_BATCH'],
+        )
+    return app
+
+
+# полнотекстовый индекс по title и description: FTS5-таблица с внешним содержимым
+# поверх представления movie_fts_content, триггеры на movie держат её в согласии с любыми вставками, в том числе bulk_insert;
+# unicode61 приводит кириллицу и латиницу к нижнему регистру, диакритику снимает
+# только у латиницы, поэтому «ё» заменяется на «е» и в индексе, и в запросе;
+# prefix ускоряет запросы для автодополнения
+def fts_fold(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+MOVIE_FTS_DDL = (
+    f"""CREATE VIEW IF NOT EXISTS movie_fts_content AS
+        SELECT id, {fts_fold('title')} AS title, {fts_fold('description')} AS description FROM movie""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS movie_fts USING fts5(
+        title, description, content='movie_fts_content', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_fts_ai AFTER INSERT ON movie BEGIN
+        INSERT INTO movie_fts(rowid, title, description)
+        VALUES (new.id, {fts_fold('new.title')}, {fts_fold('new.description')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_fts_ad AFTER DELETE ON movie BEGIN
+        INSERT INTO movie_fts(movie_fts, rowid, title, description)
+        VALUES ('delete', old.id, {fts_fold('old.title')}, {fts_fold('old.description')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_fts_au AFTER UPDATE OF title, description ON movie BEGIN
+        INSERT INTO movie_fts(movie_fts, rowid, title, description)
+        VALUES ('delete', old.id, {fts_fold('old.title')}, {fts_fold('old.description')});
+        INSERT INTO movie_fts(rowid, title, description)
+        VALUES (new.id, {fts_fold('new.title')}, {fts_fold('new.description')});
+    END""",
+)
+
+
+def create_search_index(conn):
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'movie_fts'")).first()
+    for statement in MOVIE_FTS_DDL:
+        conn.execute(text(statement))
+    if not exists:
+        conn.execute(text("INSERT INTO movie_fts(movie_fts) VALUES ('rebuild')"))
+
+
+@event.listens_for(Movie.__table__, 'after_create')
+def movie_after_create(target, conn, **kw):
+    create_search_index(conn)
+
+
+@event.listens_for(Movie.__table__, 'before_drop')
+def movie_before_drop(target, conn, **kw):
+    conn.execute(text('DROP TABLE IF EXISTS movie_fts'))
+    conn.execute(text('DROP VIEW IF EXISTS movie_fts_content'))
+
+
+def stats_add(row):
+    # добавить фильм row (new/old) в группы всех разрезов
+    return ''.join(f"""
+        INSERT INTO movie_stats(dimension, key, movies, rated, rating_sum, rating_min, rating_max)
+        SELECT '{column}', {row}.{column}, 1, {row}.rating IS NOT NULL, coalesce({row}.rating, 0),
+               {row}.rating, {row}.rating
+        WHERE {row}.{column} IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET
+            movies = movies + 1,
+            rated = rated + excluded.rated,
+            rating_sum = rating_sum + excluded.rating_sum,
+            rating_min = CASE WHEN rating_min IS NULL OR excluded.rating_min < rating_min
+                              THEN coalesce(excluded.rating_min, rating_min) ELSE rating_min END,
+            rating_max = CASE WHEN rating_max IS NULL OR excluded.rating_max > rating_max
+                              THEN coalesce(excluded.rating_max, rating_max) ELSE rating_max END;""" for column in STATS_DIMENSIONS.values())
+
+
+def stats_remove(row):
+    # убрать фильм из групп; min/max пересчитываются, только если удалённый рейтинг
+    # был крайним в группе, - по индексу (column, rating), два поиска без обхода группы
+    return ''.join(f"""
+        UPDATE movie_stats SET
+            movies = movies - 1,
+            rated = rated - ({row}.rating IS NOT NULL),
+            rating_sum = rating_sum - coalesce({row}.rating, 0)
+        WHERE dimension = '{column}' AND key = {row}.{column};
+        UPDATE movie_stats SET
+            rating_min = (SELECT min(rating) FROM movie WHERE {column} = {row}.{column}),
+            rating_max = (SELECT max(rating) FROM movie WHERE {column} = {row}.{column})
+        WHERE dimension = '{column}' AND key = {row}.{column}
+            AND ({row}.rating = rating_min OR {row}.rating = rating_max);
+        DELETE FROM movie_stats WHERE dimension = '{column}' AND key = {row}.{column} AND movies = 0;""" for column in STATS_DIMENSIONS.values())
+
+
+MOVIE_STATS_DDL = (
+    f"""CREATE TRIGGER IF NOT EXISTS movie_stats_ai AFTER INSERT ON movie BEGIN
+        {stats_add('new')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_stats_ad AFTER DELETE ON movie BEGIN
+        {stats_remove('old')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS movie_stats_au
+        AFTER UPDATE OF genre_id, director_id, year, rating ON movie BEGIN
+        {stats_remove('old')}
+        {stats_add('new')}
+    END""",
+)
+
+
+def rebuild_stats_summary(conn):
+    conn.execute(text('DELETE FROM movie_stats'))
+    for column in STATS_DIMENSIONS.values():
+        conn.execute(text(
+            'INSERT INTO movie_stats(dimension, key, movies, rated, rating_sum, rating_min, rating_max) '
+            f"SELECT '{column}', {column}, count(*), count(rating), total(rating), min(rating), max(rating) "
+            f'FROM movie WHERE {column} IS NOT NULL GROUP BY {column}'
+        ))
+
+
+def create_stats_summary(conn):
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'movie_stats_ai'")).first()
+    for statement in MOVIE_STATS_DDL:
+        conn.execute(text(statement))
+    if not exists:
+        rebuild_stats_summary(conn)
+
+
+# счётчик изменённых строк movie: по нему RatingIndex отличает свои записи от чужих
+MOVIE_CHANGE_DDL = (
+    """CREATE TABLE IF NOT EXISTS movie_change_seq (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        seq INTEGER NOT NULL
+    )""",
+    'INSERT OR IGNORE INTO movie_change_seq(id, seq) VALUES (1, 0)',
+) + tuple(
+    f"""CREATE TRIGGER IF NOT EXISTS movie_change_{suffix} AFTER {event_name} ON movie BEGIN
+        UPDATE movie_change_seq SET seq = seq + 1 WHERE id = 1;
+    END"""
+    for suffix, event_name in (('ai', 'INSERT'), ('ad', 'DELETE'), ('au', 'UPDATE'))
+)
+
+
+def create_change_counter(conn):
+    for statement in MOVIE_CHANGE_DDL:
+        conn.execute(text(statement))
+
+
+@event.listens_for(db.Model.metadata, 'after_create')
+def metadata_after_create(target, conn, **kw):
+    create_stats_summary(conn)
+    create_change_counter(conn)
+
+
+MOVIE_TRIGGERS = (
+    'movie_fts_ai', 'movie_fts_ad', 'movie_fts_au',
+    'movie_stats_ai', 'movie_stats_ad', 'movie_stats_au',
+    'movie_change_ai', 'movie_change_ad', 'movie_change_au',
+)
+
+
+# массовая загрузка: построчные триггеры снимаются, а поиск и сводка
+# пересобираются одним проходом в конце - это на порядок быстрее
+@contextmanager
+def derived_tables_suspended(conn):
+    for name in MOVIE_TRIGGERS:
+        conn.execute(text(f'DROP TRIGGER IF EXISTS {name}'))
+    try:
+        yield
+    finally:
+        with conn.begin():
+            for statement in MOVIE_FTS_DDL + MOVIE_STATS_DDL + MOVIE_CHANGE_DDL:
+                conn.execute(text(statement))
+            conn.execute(text("INSERT INTO movie_fts(movie_fts) VALUES ('rebuild')"))
+            rebuild_stats_summary(conn)
+            # вся загрузка - одно изменение: индексам рейтингов в воркерах хватит сброса
+            conn.execute(text('UPDATE movie_change_seq SET seq = seq + 1 WHERE id = 1'))
+
+
+def create_indexes():
+    # create_all не добавляет индексы и колонки в уже существующие таблицы
+    db.create_all()
+    columns = {row.name for row in db.session.execute(text('PRAGMA table_info(movie)'))}
+    if 'version' not in columns:
+        db.session.execute(text('ALTER TABLE movie ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+        db.session.commit()
+    for index in Movie.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+    with db.engine.begin() as conn:
+        create_search_index(conn)
+        create_stats_summary(conn)
+        create_change_counter(conn)
+
+
+def filter_movies(query, args):
+    for name in ('director_id', 'genre_id', 'year'):
+        value = args.get(name, type=int)
+        if value is not None:
+            query = query.filter(getattr(Movie, name) == value)
+    for name, cast in (('year', int), ('rating', float)):
+        column = getattr(Movie, name)
+        low = args.get(f'{name}_from', type=cast)
+        high = args.get(f'{name}_to', type=cast)
+        if low is not None:
+            query = query.filter(column >= low)
+        if high is not None:
+            query = query.filter(column <= high)
+    return query
+
+
+# вставка пачками через executemany, одна транзакция на пачку;
+# используется и загрузчиком create_data.py, и POST /movies/bulk
+def bulk_insert(model, rows, conn, batch_size=BULK_BATCH_SIZE):
+    table = model.__table__
+    defaults = {column.name: column.default.arg if column.default else None for column in table.columns}
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = [
+            {name: row.get(name, default) for name, default in defaults.items()}
+            for row in islice(rows, batch_size)
+        ]
+        if not batch:
+            return count
+        with conn.begin():
+            conn.execute(table.insert(), batch)
+        count += len(batch)
+
+
+# в кэше лежит готовое тело ответа, поэтому попадание обходится
+# без SQL и marshmallow; ETag считается от тела
+def cached(key):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, **kwargs):
+            cache_key = key(**kwargs)
+            entry = cache.get(cache_key)
+            if entry is None:
+                data, status = view(self, **kwargs)
+                body = json.dumps(data, ensure_ascii=False)
+                entry = {
+                    'body': body,
+                    'etag': hashlib.md5(body.encode()).hexdigest(),
+                    'last_modified': time.time(),
+                }
+                cache.set(cache_key, entry)
+            response = current_app.response_class(entry['body'], mimetype='application/json')
+            response.set_etag(entry['etag'])
+            response.last_modified = entry['last_modified']
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def movie_cache_keys(mid, embeds=('', 'director', 'director,genre', 'genre')):
+    return [f'movie:{mid}:{embed}' for embed in embeds]
+
+
+def invalidate_movie(mid):
+    cache.delete(*movie_cache_keys(mid))
+
+
+def invalidate_related(model, pk):
+    # фильмы, в которые встроен изменённый режиссёр или жанр
+    name = model.__tablename__
+    column = getattr(Movie, f'{name}_id')
+    embeds = (name, 'director,genre')
+    keys = [f'{name}s', f'{name}:{pk}']
+    for (mid,) in db.session.query(Movie.id).filter(column == pk):
+        keys.extend(movie_cache_keys(mid, embeds))
+    cache.delete(*keys)
+
+
+def load_or_400(schema, partial=False, data=None):
+    try:
+        return schema.load((request.json or {}) if data is None else data, partial=partial)
+    except ValidationError as e:
+        abort(400, 'invalid data', errors=e.messages)
+
+
+def update_instance(instance, schema, partial=False):
+    for name, value in load_or_400(schema, partial).items():
+        setattr(instance, name, value)
+    db.session.commit()
+
+
+# изменения фильмов: (id, поля, ожидаемая версия или None) -> (статус, версия);
+# каждое - условный UPDATE, все - в одной транзакции
+def apply_movie_update(conn, mid, values, expected):
+    table = Movie.__table__
+    statement = table.update().where(table.c.id == mid)
+    if expected is not None:
+        statement = statement.where(table.c.version == expected)
+    updated = conn.execute(statement.values(**values, version=table.c.version + 1)).rowcount
+    version = conn.execute(select(table.c.version).where(table.c.id == mid)).scalar()
+    if updated:
+        return 204, version
+    return (404, None) if version is None else (409, version)
+
+
+def apply_movie_updates(mutations):
+    # транзакция - её фоновый писатель при ошибке повторяет по запросам - и после commit
+    # обновление индекса рейтингов в памяти, которое ошибкой не заканчивается
+    with db.engine.begin() as conn:
+        results = [apply_movie_update(conn, *mutation) for mutation in mutations]
+        updated = [mid for (mid, _, _), (status, _) in zip(mutations, results) if status == 204]
+        change = ranking_change(conn, updated, len(updated))
+    rating_index.apply(*change)
+    return results
+
+
+def movies_updated(mutations, results):
+    # после commit и вне повторяемой части: сбой кэша не должен приводить
+    # к повторному применению уже записанных изменений
+    for (mid, _, _), (status, _) in zip(mutations, results):
+        if status == 204:
+            invalidate_movie(mid)
+
+
+def write_movies(mutations):
+    # в режиме WRITE_COALESCING изменения уходят фоновому писателю
+    writer = current_app.extensions.get('movie_writer')
+    if writer is None:
+        results = apply_movie_updates(mutations)
+    else:
+        future = writer.submit(mutations)
+        try:
+            results = future.result(timeout=current_app.config['WRITE_COALESCE_TIMEOUT_MS'] / 1000)
+        except FutureTimeout:
+            # если писатель ещё не взял изменения, они уже не применятся
+            future.cancel()
+            abort(503, 'movie writer is not responding')
+    movies_updated(mutations, results)
+    return results
+
+
+def movie_mutation(payload, partial, mid=None):
+    if not isinstance(payload, dict):
+        abort(400, 'expected an object')
+    payload = dict(payload)
+    if mid is None:
+        mid = payload.pop('id', None)
+        # bool в Python - подкласс int, а JSON true не должен стать id 1
+        if isinstance(mid, bool) or not isinstance(mid, int):
+            abort(400, 'id is required')
+    expected = payload.pop('version', None)
+    if expected is not None and (isinstance(expected, bool) or not isinstance(expected, int)):
+        abort(400, 'version must be an integer')
+    return mid, load_or_400(movie_schema, partial, payload), expected
+
+
+def write_movie_or_abort(mid, partial):
+    status, version = write_movies([movie_mutation(request.json or {}, partial, mid)])[0]
+    if status == 404:
+        movie_ns.abort(404)
+    if status == 409:
+        movie_ns.abort(409, 'movie was modified', version=version)
+    return '', 204
+
+
+# /movies/top и /movies/<id>/related читают RatingIndex; группа, которой нет в памяти,
+# и списки глубже RATING_INDEX_TOP_K читаются из SQL через ranking_rows
+def ranking_select():
+    return select(Movie.id, Movie.title, Movie.year, Movie.rating, Movie.genre_id, Movie.director_id)
+
+
+def ranking_rows(name=None, value=None, limit=DEFAULT_TOP_SIZE):
+    query = ranking_select()
+    if name is not None:
+        query = query.where(getattr(Movie, name) == value)
+    # в SQLite NULL при DESC идёт последним - тот же порядок, что и в индексе
+    return db.session.execute(query.order_by(Movie.rating.desc(), Movie.id).limit(limit)).all()
+
+
+# запросы собираются один раз: сборка select на каждую запись стоила дороже самой записи
+CHANGE_SEQ = text('SELECT seq FROM movie_change_seq')
+CHANGED_MOVIES = ranking_select().where(Movie.id.in_(bindparam('ids', expanding=True)))
+
+
+# запись этого процесса для RatingIndex.apply: счётчик movie_change_seq и новые значения
+# фильмов читаются тем же соединением до commit, то есть ровно после этой записи;
+# changed - сколько строк movie она вставила, изменила или удалила
+def ranking_change(conn, ids, changed):
+    seq = conn.execute(CHANGE_SEQ).scalar()
+    rows = []
+    for start in range(0, len(ids), 500):
+        rows += conn.execute(CHANGED_MOVIES, {'ids': ids[start:start + 500]}).all()
+    return seq, changed, ids, rows
+
+
+def warm_rating_index():
+    # вызывается при старте воркера: весь каталог и жанры сразу, режиссёры - по запросу
+    rating_index.warm([genre_id for (genre_id,) in db.session.query(Genre.id)])
+
+
+def top_limit(args):
+    return max(1, min(args.get('limit', DEFAULT_TOP_SIZE, type=int), MAX_PAGE_SIZE))
+
+
+# ?embed=director,genre: связи грузятся тем же SELECT через JOIN,
+# поэтому число запросов не зависит от размера страницы
+def parse_embed(args):
+    embed = [name for name in args.get('embed', '').split(',') if name]
+    unknown = set(embed) - set(EMBEDDABLE)
+    if unknown:
+        movie_ns.abort(400, f"unknown embed: {', '.join(sorted(unknown))}")
+    # одно каноническое написание на набор: по нему строится ключ кэша, и только такие ключи сбрасываются
+    return sorted(set(embed))
+
+
+def embed_options(embed):
+    return [joinedload(getattr(Movie, name)) for name in embed]
+
+
+def embed_schema(embed, many=False):
+    if not embed:
+        return movies_schema if many else movie_schema
+    exclude = [name for name in EMBEDDABLE if name not in embed]
+    return MovieSchema(many=many, exclude=exclude)
+
+
+# слова запроса экранируются кавычками, последнее ищется по префиксу:
+# «омерз вос» -> "омерз" "вос"*
+def fts_query(q):
+    words = re.findall(r'\w+', q.replace('ё', 'е').replace('Ё', 'Е'))
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def stats_rows(rows, column):
+    return [
+        {
+            column: row.key,
+            'count': row.movies,
+            'avg_rating': round(row.rating_sum / row.rated, 2) if row.rated else None,
+            'min_rating': row.rating_min,
+            'max_rating': row.rating_max,
+        }
+        for row in rows
+    ]
+
+
+# ?top=N - N групп с наибольшим средним рейтингом, иначе все группы по порядку ключа
+def movie_stats(column, top=None):
+    query = MovieStats.query.filter(MovieStats.dimension == column)
+    if top:
+        avg_rating = MovieStats.rating_sum / db.func.nullif(MovieStats.rated, 0)
+        query = query.order_by(avg_rating.desc().nullslast(), MovieStats.key).limit(top)
+    else:
+        query = query.order_by(MovieStats.key)
+    return stats_rows(query, column)
+
+
+# то же через GROUP BY по movie; для сверки и сравнения со сводкой
+def live_movie_stats(column, top=None):
+    key = getattr(Movie, column)
+    query = db.session.query(
+        key.label('key'),
+        db.func.count().label('movies'),
+        db.func.count(Movie.rating).label('rated'),
+        db.func.total(Movie.rating).label('rating_sum'),
+        db.func.min(Movie.rating).label('rating_min'),
+        db.func.max(Movie.rating).label('rating_max'),
+    ).filter(key.isnot(None)).group_by(key)
+    if top:
+        query = query.order_by(db.func.avg(Movie.rating).desc().nullslast(), key).limit(top)
+    else:
+        query = query.order_by(key)
+    return stats_rows(query, column)
+
+
+# выгрузка всего каталога: строки читаются курсором порциями по EXPORT_BATCH_SIZE
+# и сразу уходят клиенту, так что память не зависит от размера таблицы
+EXPORT_COLUMNS = (
+    'id', 'title', 'description', 'trailer', 'year', 'rating',
+    'genre_id', 'genre_name', 'director_id', 'director_name',
+)
+
+
+def export_rows():
+    query = db.session.query(
+        Movie.id, Movie.title, Movie.description, Movie.trailer, Movie.year, Movie.rating,
+        Movie.genre_id, Genre.name.label('genre_name'),
+        Movie.director_id, Director.name.label('director_name'),
+    ).outerjoin(Genre, Movie.genre_id == Genre.id) \
+        .outerjoin(Director, Movie.director_id == Director.id) \
+        .order_by(Movie.id)
+    return iter(query.yield_per(EXPORT_BATCH_SIZE))
+
+
+def export_ndjson(rows):
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    for batch in iter(lambda: list(islice(rows, EXPORT_BATCH_SIZE)), []):
+        yield ''.join(encode(dict(zip(EXPORT_COLUMNS, row))) + '\n' for row in batch)
+
+
+def export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in iter(lambda: list(islice(rows, EXPORT_BATCH_SIZE)), []):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv'),
+}
+
+
+# страница по курсору: фильмы с id > after_id, не больше limit штук
+def paginate_movies(query, args):
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after_id = args.get('after_id', type=int)
+    if after_id is not None:
+        query = query.filter(Movie.id > after_id)
+    movies = query.order_by(Movie.id).limit(limit + 1).all()
+    next_after_id = movies[limit - 1].id if len(movies) > limit else None
+    return movies[:limit], next_after_id
+
+
+@movie_ns.route('/')
+class MoviesView(Resource):
+    def get(self):
+        embed = parse_embed(request.args)
+        query = Movie.query.options(*embed_options(embed))
+        query = filter_movies(query, request.args)
+        movies, next_after_id = paginate_movies(query, request.args)
+        headers = {}
+        if next_after_id is not None:
+            headers['X-Next-After-Id'] = str(next_after_id)
+        return embed_schema(embed, many=True).dump(movies), 200, headers
+
+    def post(self):
+        movie = Movie(**load_or_400(movie_schema))
+        db.session.add(movie)
+        db.session.flush()
+        # id запоминается до commit: после него обращение к movie.id - лишний SELECT
+        mid = movie.id
+        change = ranking_change(db.session.connection(), [mid], 1)
+        db.session.commit()
+        rating_index.apply(*change)
+        return '', 201, {'Location': f'/movies/{mid}'}
+
+    # пакетный PATCH: [{"id": 1, "version": 3, "rating": 8.1}, ...] одной транзакцией
+    def patch(self):
+        payload = request.json
+        if not isinstance(payload, list):
+            movie_ns.abort(400, 'expected a list of movies')
+        if len(payload) > BULK_BATCH_SIZE:
+            movie_ns.abort(413, f'at most {BULK_BATCH_SIZE} movies per request')
+        mutations = [movie_mutation(item, partial=True) for item in payload]
+        results = write_movies(mutations)
+        return [
+            {'id': mid, 'status': status, 'version': version}
+            for (mid, _, _), (status, version) in zip(mutations, results)
+        ], 200
+
+
+@movie_ns.route('/search')
+class MoviesSearchView(Resource):
+    def get(self):
+        match = fts_query(request.args.get('q', ''))
+        if match is None:
+            movie_ns.abort(400, 'q is required')
+        embed = parse_embed(request.args)
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        # bm25: совпадение в названии весит больше, чем в описании
+        ids = [row.rowid for row in db.session.execute(text(
+            'SELECT rowid FROM movie_fts WHERE movie_fts MATCH :match '
+            'ORDER BY bm25(movie_fts, 10.0, 1.0) LIMIT :limit'
+        ), {'match': match, 'limit': limit})]
+        movies = Movie.query.options(*embed_options(embed)).filter(Movie.id.in_(ids)).all()
+        position = {mid: index for index, mid in enumerate(ids)}
+        movies.sort(key=lambda movie: position[movie.id])
+        return embed_schema(embed, many=True).dump(movies), 200
+
+
+@movie_ns.route('/export')
+class MoviesExportView(Resource):
+    def get(self):
+        name = request.args.get('format', 'ndjson')
+        if name not in EXPORT_FORMATS:
+            movie_ns.abort(400, f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        export, mimetype = EXPORT_FORMATS[name]
+        return Response(
+            stream_with_context(export(export_rows())),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=movies.{name}'},
+        )
+
+
+@movie_ns.route('/bulk')
+class MoviesBulkView(Resource):
+    def post(self):
+        payload = request.json
+        if not isinstance(payload, list):
+            movie_ns.abort(400, 'expected a list of movies')
+        if len(payload) > BULK_BATCH_SIZE:
+            movie_ns.abort(413, f'at most {BULK_BATCH_SIZE} movies per request')
+        try:
+            rows = movies_schema.load(payload)
+        except ValidationError as e:
+            movie_ns.abort(400, 'invalid movies', errors=e.messages)
+        with db.engine.connect() as conn:
+            max_id = conn.execute(select(db.func.max(Movie.id))).scalar() or 0
+            count = bulk_insert(Movie, rows, conn)
+            # пачка не больше BULK_BATCH_SIZE - одна транзакция; новые id и счётчик читаются
+            # уже после неё, и чужая запись в промежутке просто даст несовпадение и сброс
+            with conn.begin():
+                ids = [mid for (mid,) in conn.execute(select(Movie.id).where(Movie.id > max_id))]
+                change = ranking_change(conn, ids, count)
+        rating_index.apply(*change)
+        return {'inserted': count}, 201
+
+
+@movie_ns.route('/top')
+class MoviesTopView(Resource):
+    def get(self):
+        genre_id = request.args.get('genre_id', type=int)
+        if genre_id is None:
+            return rating_index.top(limit=top_limit(request.args)), 200
+        return rating_index.top('genre_id', genre_id, top_limit(request.args)), 200
+
+
+@movie_ns.route('/<int:mid>')
+class MovieView(Resource):
+    @cached(lambda mid: f"movie:{mid}:{','.join(parse_embed(request.args))}")
+    def get(self, mid):
+        embed = parse_embed(request.args)
+        movie = Movie.query.options(*embed_options(embed)).get_or_404(mid)
+        return embed_schema(embed).dump(movie), 200
+
+    def put(self, mid):
+        return write_movie_or_abort(mid, partial=False)
+
+    def patch(self, mid):
+        return write_movie_or_abort(mid, partial=True)
+
+    def delete(self, mid):
+        db.session.delete(Movie.query.get_or_404(mid))
+        db.session.flush()
+        change = ranking_change(db.session.connection(), [mid], 1)
+        db.session.commit()
+        rating_index.apply(*change)
+        invalidate_movie(mid)
+        return '', 204
+
+
+# «ещё у режиссёра», а если их мало - лучшие того же жанра
+@movie_ns.route('/<int:mid>/related')
+class MovieRelatedView(Resource):
+    def get(self, mid):
+        movie = rating_index.get(mid)
+        if movie is None:
+            # фильма нет ни в одном списке индекса - по первичному ключу
+            row = db.session.query(Movie.director_id, Movie.genre_id).filter(Movie.id == mid).first()
+            if row is None:
+                movie_ns.abort(404)
+            movie = row._asdict()
+        limit = top_limit(request.args)
+        related = []
+        for name in ('director_id', 'genre_id'):
+            if movie[name] is not None and len(related) < limit:
+                exclude = {mid} | {item['id'] for item in related}
+                related += rating_index.top(name, movie[name], limit - len(related), exclude)
+        return related, 200
+
+
+@director_ns.route('/')
+class DirectorsView(Resource):
+    @cached(lambda: 'directors')
+    def get(self):
+        return directors_schema.dump(Director.query.order_by(Director.id).all()), 200
+
+    def post(self):
+        director = Director(**load_or_400(director_schema))
+        db.session.add(director)
+        db.session.commit()
+        cache.delete('directors')
+        return '', 201, {'Location': f'/directors/{director.id}'}
+
+
+@director_ns.route('/<int:did>')
+class DirectorView(Resource):
+    @cached(lambda did: f'director:{did}')
+    def get(self, did):
+        return director_schema.dump(Director.query.get_or_404(did)), 200
+
+    def put(self, did):
+        update_instance(Director.query.get_or_404(did), director_schema)
+        invalidate_related(Director, did)
+        return '', 204
+
+    def patch(self, did):
+        update_instance(Director.query.get_or_404(did), director_schema, partial=True)
+        invalidate_related(Director, did)
+        return '', 204
+
+    def delete(self, did):
+        db.session.delete(Director.query.get_or_404(did))
+        db.session.commit()
+        invalidate_related(Director, did)
+        return '', 204
+
+
+@genre_ns.route('/')
+class GenresView(Resource):
+    @cached(lambda: 'genres')
+    def get(self):
+        return genres_schema.dump(Genre.query.order_by(Genre.id).all()), 200
+
+    def post(self):
+        genre = Genre(**load_or_400(genre_schema))
+        db.session.add(genre)
+        db.session.commit()
+        cache.delete('genres')
+        return '', 201, {'Location': f'/genres/{genre.id}'}
+
+
+@genre_ns.route('/<int:gid>')
+class GenreView(Resource):
+    @cached(lambda gid: f'genre:{gid}')
+    def get(self, gid):
+        return genre_schema.dump(Genre.query.get_or_404(gid)), 200
+
+    def put(self, gid):
+        update_instance(Genre.query.get_or_404(gid), genre_schema)
+        invalidate_related(Genre, gid)
+        return '', 204
+
+    def patch(self, gid):
+        update_instance(Genre.query.get_or_404(gid), genre_schema, partial=True)
+        invalidate_related(Genre, gid)
+        return '', 204
+
+    def delete(self, gid):
+        db.session.delete(Genre.query.get_or_404(gid))
+        db.session.commit()
+        invalidate_related(Genre, gid)
+        return '', 204
+
+
+@stats_ns.route('/<any(genres, directors, years):dimension>')
+class StatsView(Resource):
+    def get(self, dimension):
+        top = request.args.get('top', type=int)
+        if top is not None and top < 1:
+            stats_ns.abort(400, 'top must be positive')
+        return movie_stats(STATS_DIMENSIONS[dimension], top), 200
+
 
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        create_indexes()
+        warm_rating_index()
     app.run(debug=True)
@@ -0,0 +1,79 @@
+# benchmarks/bench_embed.py
+
+# число SQL-запросов и время GET /movies/?embed=director,genre
+# для страницы из 1000 фильмов; число запросов не должно зависеть от размера страницы
+# запуск: python -m benchmarks.bench_embed
+
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from app import create_app, db, Director, Genre, Movie
+
+MOVIES = 5_000
+DIRECTORS = 500
+GENRES = 18
+
+
+def fill():
+    random.seed(0)
+    db.create_all()
+    db.session.execute(Director.__table__.insert(), [
+        {'id': pk, 'name': f'director {pk}'} for pk in range(1, DIRECTORS + 1)
+    ])
+    db.session.execute(Genre.__table__.insert(), [
+        {'id': pk, 'name': f'genre {pk}'} for pk in range(1, GENRES + 1)
+    ])
+    db.session.execute(Movie.__table__.insert(), [
+        {
+            'id': pk,
+            'title': f'movie {pk}',
+            'year': random.randint(1950, 2022),
+            'rating': round(random.uniform(1, 10), 1),
+            'genre_id': random.randint(1, GENRES),
+            'director_id': random.randint(1, DIRECTORS),
+        }
+        for pk in range(1, MOVIES + 1)
+    ])
+    db.session.commit()
+
+
+def count_queries(client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        start = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, response.status_code
+    return len(statements), elapsed * 1000
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+    app.app_context().push()
+    fill()
+    client = app.test_client()
+    counts = set()
+    for limit in (1, 10, 100, 1000):
+        queries, ms = count_queries(client, f'/movies/?limit={limit}&embed=director,genre')
+        counts.add(queries)
+        print(f'limit {limit:>4}: {queries} queries, {ms:7.2f} ms')
+    assert len(counts) == 1, f'query count depends on page size: {sorted(counts)}'
+    queries, ms = count_queries(client, '/movies/1?embed=director,genre')
+    assert queries == counts.pop()
+    print(f'detail:     {queries} queries, {ms:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_export.py
+
+# пиковая память и скорость GET /movies/export на миллионах фильмов (скорость под tracemalloc ниже реальной);
+# потолок пика проверяет tests/test_export.py (2M строк - с --runslow)
+# запуск: python -m benchmarks.bench_export
+
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import text
+
+from app import Director, Genre, Movie, create_app, db
+
+SIZES = (100_000, 2_000_000)
+FILL_BATCH = 100_000
+
+
+def fill(rows):
+    random.seed(0)
+    db.drop_all()
+    db.create_all()
+    # триггеры поиска и сводки к выгрузке отношения не имеют и только замедляют заполнение
+    for trigger in ('movie_fts_ai', 'movie_stats_ai'):
+        db.session.execute(text(f'DROP TRIGGER {trigger}'))
+    db.session.execute(Director.__table__.insert(), [{'id': pk, 'name': f'Режиссёр {pk}'} for pk in range(1, 1001)])
+    db.session.execute(Genre.__table__.insert(), [{'id': pk, 'name': f'Жанр {pk}'} for pk in range(1, 19)])
+    for start in range(1, rows + 1, FILL_BATCH):
+        db.session.execute(Movie.__table__.insert(), [
+            {
+                'id': pk,
+                'title': f'Фильм {pk}',
+                'description': 'Описание, с запятой и "кавычками"',
+                'trailer': f'https://www.youtube.com/watch?v={pk}',
+                'year': random.randint(1950, 2022),
+                'rating': round(random.uniform(1, 10), 1),
+                'genre_id': random.randint(1, 18),
+                'director_id': random.randint(1, 1000),
+            }
+            for pk in range(start, min(start + FILL_BATCH, rows + 1))
+        ])
+    db.session.commit()
+
+
+def export(client, fmt):
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(f'/movies/export?format={fmt}', buffered=False)
+    size = lines = 0
+    for chunk in response.response:
+        size += len(chunk)
+        lines += chunk.count('\n') if isinstance(chunk, str) else chunk.count(b'\n')
+    response.close()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return lines, size, elapsed, peak
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+    app.app_context().push()
+    client = app.test_client()
+    for rows in SIZES:
+        fill(rows)
+        for fmt in ('ndjson', 'csv'):
+            lines, size, elapsed, peak = export(client, fmt)
+            assert lines >= rows, (lines, rows)
+            print(
+                f'{rows:>9} rows {fmt:>6}: {size / 2 ** 20:7.1f} MiB in {elapsed:5.1f}s '
+                f'({rows / elapsed:8.0f} rows/s), peak {peak / 2 ** 20:5.2f} MiB'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_pagination.py
+
+# время ответа GET /movies/ от первой до 10 000-й страницы на миллионе фильмов
+# запуск: python -m benchmarks.bench_pagination
+
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app import create_app, db, Movie
+
+ROWS = 1_000_000
+PAGE_SIZE = 100
+PAGES = (1, 10, 100, 1_000, 10_000)
+REPEAT = 20
+
+
+def fill(rows):
+    random.seed(0)
+    db.create_all()
+    db.session.execute(
+        Movie.__table__.insert(),
+        [
+            {
+                'id': pk,
+                'title': f'movie {pk}',
+                'description': 'description',
+                'trailer': 'trailer',
+                'year': random.randint(1950, 2022),
+                'rating': round(random.uniform(1, 10), 1),
+                'genre_id': random.randint(1, 18),
+                'director_id': random.randint(1, 1000),
+            }
+            for pk in range(1, rows + 1)
+        ],
+    )
+    db.session.commit()
+
+
+def measure(client, url):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return statistics.median(timings) * 1000
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+    app.app_context().push()
+    fill(ROWS)
+    client = app.test_client()
+    for page in PAGES:
+        after_id = (page - 1) * PAGE_SIZE
+        plain = measure(client, f'/movies/?limit={PAGE_SIZE}&after_id={after_id}')
+        filtered = measure(client, f'/movies/?limit={PAGE_SIZE}&after_id={after_id // 18}&genre_id=7')
+        print(f'page {page:>6}: {plain:7.2f} ms, genre_id=7: {filtered:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
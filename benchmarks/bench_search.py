@@ -0,0 +1,81 @@
+# benchmarks/bench_search.py
+
+# время GET /movies/search на миллионе фильмов в сравнении с LIKE '%...%'
+# запуск: python -m benchmarks.bench_search
+
+import os
+import random
+import statistics
+import tempfile
+import time
+from itertools import accumulate
+
+from sqlalchemy import text
+
+from app import create_app, db, Movie
+
+ROWS = 1_000_000
+REPEAT = 20
+SYLLABLES = 'ба ве го да жи зо ки ла ме но по ре са ту фи хо це чу ша ёл ка ра ни то ль ст'.split()
+QUERIES = ('ковбой', 'ёлка', 'охотник за', 'мор', 'зеркало поезд')
+
+
+def vocabulary(size=20_000):
+    # слова из слогов плюс слова запросов; частоты убывают по закону Ципфа
+    words = {''.join(random.choices(SYLLABLES, k=random.randint(2, 4))) for _ in range(size)}
+    words = sorted(words) + ' '.join(QUERIES).split() + ['море', 'морошка']
+    random.shuffle(words)
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    return words, cum_weights
+
+
+def fill(rows):
+    random.seed(0)
+    words, cum_weights = vocabulary()
+    db.create_all()
+    db.session.execute(
+        Movie.__table__.insert(),
+        [
+            {
+                'id': pk,
+                'title': ' '.join(random.choices(words, cum_weights=cum_weights, k=3)).capitalize(),
+                'description': ' '.join(random.choices(words, cum_weights=cum_weights, k=12)),
+                'year': random.randint(1950, 2022),
+                'rating': round(random.uniform(1, 10), 1),
+            }
+            for pk in range(1, rows + 1)
+        ],
+    )
+    db.session.commit()
+
+
+def measure(call):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+    app.app_context().push()
+    start = time.perf_counter()
+    fill(ROWS)
+    print(f'fill {ROWS} rows with FTS triggers: {time.perf_counter() - start:.1f}s')
+    client = app.test_client()
+    # для сравнения: поиск подстрокой с сортировкой по рейтингу, как сделал бы LIKE-эндпоинт
+    like = text(
+        'SELECT id FROM movie WHERE title LIKE :q OR description LIKE :q '
+        'ORDER BY rating DESC LIMIT 20'
+    )
+    for q in QUERIES:
+        fts = measure(lambda: client.get('/movies/search', query_string={'q': q, 'limit': 20}))
+        scan = measure(lambda: db.session.execute(like, {'q': f'%{q}%'}).all())
+        print(f'{q!r:>16}: fts5 {fts:8.2f} ms, like {scan:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
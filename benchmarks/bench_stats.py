@@ -0,0 +1,74 @@
+# benchmarks/bench_stats.py
+
+# /stats/* из сводной таблицы movie_stats против GROUP BY по миллиону фильмов,
+# а также цена поддержки сводки триггерами на запись
+# запуск: python -m benchmarks.bench_stats
+
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app import Movie, create_app, db, live_movie_stats, movie_stats, STATS_DIMENSIONS
+
+ROWS = 1_000_000
+REPEAT = 10
+
+
+def movie(pk):
+    return {
+        'id': pk,
+        'title': f'movie {pk}',
+        'year': random.randint(1900, 2022),
+        'rating': round(random.uniform(1, 10), 1),
+        'genre_id': random.randint(1, 18),
+        'director_id': random.randint(1, 10_000),
+    }
+
+
+def fill(rows):
+    random.seed(0)
+    db.create_all()
+    start = time.perf_counter()
+    db.session.execute(Movie.__table__.insert(), [movie(pk) for pk in range(1, rows + 1)])
+    db.session.commit()
+    return time.perf_counter() - start
+
+
+def measure(call):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+    app.app_context().push()
+    print(f'fill {ROWS} rows with summary triggers: {fill(ROWS):.1f}s')
+    client = app.test_client()
+    for dimension, column in STATS_DIMENSIONS.items():
+        assert movie_stats(column) == live_movie_stats(column)
+        summary = measure(lambda: client.get(f'/stats/{dimension}'))
+        summary_top = measure(lambda: client.get(f'/stats/{dimension}?top=10'))
+        live = measure(lambda: live_movie_stats(column))
+        live_top = measure(lambda: live_movie_stats(column, top=10))
+        print(
+            f'{dimension:>9}: summary {summary:8.2f} ms (top 10: {summary_top:7.2f} ms), '
+            f'group by {live:8.2f} ms (top 10: {live_top:7.2f} ms)'
+        )
+    updates = [(random.randint(1, ROWS), round(random.uniform(1, 10), 1)) for _ in range(1000)]
+    start = time.perf_counter()
+    for mid, rating in updates:
+        db.session.query(Movie).filter(Movie.id == mid).update({'rating': rating})
+        db.session.commit()
+    elapsed = time.perf_counter() - start
+    print(f'1000 rating updates with summary triggers: {elapsed * 1000 / len(updates):.2f} ms each')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_top.py
+
+# /movies/top и /movies/<id>/related на миллионе фильмов: приложение с RatingIndex против
+# того же эндпоинта с отключённым индексом (RATING_INDEX_TOP_K=0, ORDER BY rating в SQL).
+# Для индекса - тёплые списки, первый запрос после своей записи (применяется на месте)
+# и после чужой записи (списки перечитываются из базы)
+# запуск: python -m benchmarks.bench_top
+
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app import create_app, warm_rating_index
+from benchmarks.generate import build_db
+
+ROWS = 1_000_000
+REPEAT = 50
+LIMIT = 10
+
+
+def measure(call):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    build_db(path, ROWS)
+    indexed = create_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+    with indexed.app_context():
+        warm_rating_index()
+    # второе приложение на той же базе: для индекса первого его записи - чужие
+    plain = create_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', RATING_INDEX_TOP_K=0)
+
+    urls = (
+        ('top in genre', f'/movies/top?genre_id=7&limit={LIMIT}'),
+        ('top overall', f'/movies/top?limit={LIMIT}'),
+        ('related', f'/movies/12345/related?limit={LIMIT}'),
+    )
+    ids = iter(random.Random(1).sample(range(1, ROWS + 1), 2 * REPEAT * len(urls)))
+
+    def after_write(writer, url):
+        client = indexed.test_client()
+
+        def run():
+            assert writer.patch(f'/movies/{next(ids)}', json={'rating': 9.9}).status_code == 204
+            start = time.perf_counter()
+            client.get(url)
+            return time.perf_counter() - start
+        return statistics.median(run() for _ in range(REPEAT)) * 1000
+
+    for name, url in urls:
+        own = after_write(indexed.test_client(), url)
+        foreign = after_write(plain.test_client(), url)
+        print(
+            f'{name:>13}: cached {measure(lambda: indexed.test_client().get(url)):7.2f} ms, '
+            f'after own write {own:7.2f} ms, after foreign write {foreign:7.2f} ms, '
+            f'sql {measure(lambda: plain.test_client().get(url)):8.2f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/bench_workers.py
+
+# пропускная способность чтения при 1..N процессах-воркерах и одном процессе,
+# который всё это время пишет; профиль development (журнал отката)
+# сравнивается с production (WAL, пул соединений, busy_timeout)
+# запуск: python -m benchmarks.bench_workers
+
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from app import Movie, create_app, create_indexes, db
+from config import Config, ProductionConfig
+
+ROWS = 100_000
+DURATION = 3
+
+
+def fill(config, path):
+    random.seed(0)
+    with create_app(config, SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}').app_context():
+        create_indexes()
+        db.session.execute(Movie.__table__.insert(), [
+            {
+                'id': pk,
+                'title': f'movie {pk}',
+                'year': random.randint(1950, 2022),
+                'rating': round(random.uniform(1, 10), 1),
+                'genre_id': random.randint(1, 18),
+                'director_id': random.randint(1, 1000),
+            }
+            for pk in range(1, ROWS + 1)
+        ])
+        db.session.commit()
+
+
+def reader(config, path, start, results):
+    client = create_app(config, SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}').test_client()
+    done = errors = 0
+    start.wait()
+    deadline = time.perf_counter() + DURATION
+    while time.perf_counter() < deadline:
+        response = client.get(f'/movies/?limit=20&after_id={random.randint(0, ROWS)}')
+        if response.status_code == 200:
+            done += 1
+        else:
+            errors += 1
+    results.put(('read', done, errors))
+
+
+def writer(config, path, start, results):
+    client = create_app(config, SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}').test_client()
+    done = errors = 0
+    start.wait()
+    deadline = time.perf_counter() + DURATION
+    while time.perf_counter() < deadline:
+        mid = random.randint(1, ROWS)
+        try:
+            response = client.patch(f'/movies/{mid}', json={'rating': round(random.uniform(1, 10), 1)})
+            ok = response.status_code == 204
+        except Exception:
+            ok = False
+        if ok:
+            done += 1
+        else:
+            errors += 1
+    results.put(('write', done, errors))
+
+
+def run(config, path, readers):
+    start = multiprocessing.Barrier(readers + 1)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=reader, args=(config, path, start, results)) for _ in range(readers)]
+    processes.append(multiprocessing.Process(target=writer, args=(config, path, start, results)))
+    for process in processes:
+        process.start()
+    totals = {'read': [0, 0], 'write': [0, 0]}
+    for _ in processes:
+        kind, done, errors = results.get()
+        totals[kind][0] += done
+        totals[kind][1] += errors
+    for process in processes:
+        process.join()
+    return totals
+
+
+def main():
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+    for config in (Config, ProductionConfig):
+        path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        fill(config, path)
+        print(config.__name__)
+        for readers in counts:
+            totals = run(config, path, readers)
+            (reads, read_errors), (writes, write_errors) = totals['read'], totals['write']
+            print(
+                f'  {readers} readers: {reads / DURATION:8.0f} reads/s ({read_errors} errors), '
+                f'{writes / DURATION:6.0f} writes/s ({write_errors} errors)'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_writes.py
+
+# PATCH /movies/<id> с рейтингом из множества потоков сразу: записей в секунду
+# и ошибок "database is locked" с фоновым писателем и без него
+# запуск: python -m benchmarks.bench_writes
+
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app import create_app
+from benchmarks.generate import build_db
+from config import Config, ProductionConfig
+
+ROWS = 100_000
+THREADS = 32
+DURATION = 5
+
+
+def hammer(app):
+    done = []
+    errors = []
+    deadline = time.perf_counter() + DURATION
+
+    def worker():
+        client = app.test_client()
+        ok = failed = 0
+        while time.perf_counter() < deadline:
+            mid = random.randint(1, ROWS)
+            try:
+                status = client.patch(f'/movies/{mid}', json={'rating': round(random.uniform(1, 10), 1)}).status_code
+            except Exception:
+                status = None
+            if status == 204:
+                ok += 1
+            else:
+                failed += 1
+        done.append(ok)
+        errors.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done) / DURATION, sum(errors)
+
+
+def main():
+    for config in (Config, ProductionConfig):
+        for coalescing in (False, True):
+            path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+            build_db(path, ROWS, config=config)
+            app = create_app(config, SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', WRITE_COALESCING=coalescing)
+            rate, errors = hammer(app)
+            if coalescing:
+                app.extensions['movie_writer'].close()
+            mode = 'coalescing' if coalescing else 'per request'
+            print(f'{config.__name__:>16} {mode:>11}: {rate:8.0f} writes/s, {errors} errors')
+
+
+if __name__ == '__main__':
+    main()
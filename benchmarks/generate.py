@@ -0,0 +1,99 @@
+# benchmarks/generate.py
+
+# синтетический каталог по образцу data из create_data.py: фильмы, режиссёры и жанры
+# в масштабе 10k / 1m / 10m фильмов; пишет JSONL для create_data.py или сразу заполняет БД
+# запуск:
+#   python -m benchmarks.generate --size 1m --out movies.jsonl
+#   python -m benchmarks.generate --size 10k --db /tmp/bench.db
+
+import argparse
+import json
+import random
+
+from app import create_app, db
+from create_data import data, load
+
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+MOVIES_PER_DIRECTOR = 20
+
+
+def counts(movies):
+    return {
+        'movies': movies,
+        'directors': max(len(data['directors']), movies // MOVIES_PER_DIRECTOR),
+        'genres': len(data['genres']),
+    }
+
+
+def iter_directors(count):
+    templates = data['directors']
+    for pk in range(1, count + 1):
+        template = templates[(pk - 1) % len(templates)]
+        name = template['name'] if pk <= len(templates) else f"{template['name']} {pk // len(templates)}"
+        yield {'pk': pk, 'name': name}
+
+
+def iter_genres(count):
+    yield from data['genres'][:count]
+
+
+def iter_movies(count, directors, genres, seed=0):
+    rng = random.Random(seed)
+    templates = data['movies']
+    for pk in range(1, count + 1):
+        template = templates[(pk - 1) % len(templates)]
+        yield {
+            'pk': pk,
+            'title': template['title'] if pk <= len(templates) else f"{template['title']} {pk // len(templates)}",
+            'description': template['description'],
+            'trailer': template['trailer'],
+            'year': rng.randint(1920, 2022),
+            'rating': round(rng.uniform(1, 10), 1),
+            'genre_id': rng.randint(1, genres),
+            'director_id': rng.randint(1, directors),
+        }
+
+
+def catalog(movies, seed=0):
+    # словарь разделов с генераторами: create_data.load читает каждый раздел один раз
+    sizes = counts(movies)
+    return {
+        'directors': iter_directors(sizes['directors']),
+        'genres': iter_genres(sizes['genres']),
+        'movies': iter_movies(movies, sizes['directors'], sizes['genres'], seed),
+    }
+
+
+def write_jsonl(path, movies, seed=0):
+    with open(path, 'w', encoding='utf-8') as f:
+        for section, records in catalog(movies, seed).items():
+            for record in records:
+                f.write(json.dumps({'type': section, **record}, ensure_ascii=False) + '\n')
+
+
+def build_db(path, movies, seed=0, config=None):
+    with create_app(config, SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}').app_context():
+        db.drop_all()
+        db.create_all()
+        stats = load([catalog(movies, seed)])
+        # соединения пула закрываются, чтобы файлом можно было распоряжаться сразу
+        db.engine.dispose()
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='generate a synthetic movie catalog')
+    parser.add_argument('--size', choices=SIZES, default='10k')
+    parser.add_argument('--seed', type=int, default=0)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--out', help='write JSONL for create_data.py')
+    target.add_argument('--db', help='create and fill an SQLite database')
+    args = parser.parse_args()
+    if args.out:
+        write_jsonl(args.out, SIZES[args.size], args.seed)
+    else:
+        build_db(args.db, SIZES[args.size], args.seed)
+
+
+if __name__ == '__main__':
+    main()
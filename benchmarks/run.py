@@ -0,0 +1,289 @@
+# benchmarks/run.py
+
+# прогон сценария против SQLite через тестовый клиент Flask или против запущенного сервера;
+# сценарий повторяется --runs раз на свежей копии БД, печатаются медианы p50/p95 и RPS
+# по прогонам и их разброс; результат сохраняется в JSON и сравнивается с базовой линией,
+# код возврата 1 - если есть регрессия
+# запуск:
+#   python -m benchmarks.run --size 10k --mix read-heavy --requests 3000
+#   python -m benchmarks.run --size 10k --mix crud --save-baseline
+#   python -m benchmarks.run --size 1m --url http://localhost:5000   # сервер на БД из benchmarks.generate
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.generate import SIZES, build_db, counts
+from benchmarks.workloads import MIXES, Workload
+from config import configs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(HERE, '.data')
+BASELINE_DIR = os.path.join(HERE, 'baselines')
+OK_STATUSES = (200, 201, 204, 304)
+
+
+class TestClientTarget:
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def send(method, path, body):
+            response = client.open(path, method=method, json=body)
+            return response.status_code, response.headers.get('Location')
+        return send
+
+
+class ServerTarget:
+    def __init__(self, url):
+        self.url = urlsplit(url)
+
+    def session(self):
+        conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=60)
+
+        def send(method, path, body):
+            payload = None if body is None else json.dumps(body)
+            headers = {} if body is None else {'Content-Type': 'application/json'}
+            conn.request(method, path, payload, headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status, response.getheader('Location')
+        return send
+
+
+def prepare_db(size, profile, path):
+    # чистая копия сгенерированной БД в path на каждый прогон: сценарии её меняют;
+    # прошлая копия вместе с -wal/-shm удаляется, так что на диске всегда одна;
+    # профиль в имени - PRAGMA и настройки пула при сборке у профилей разные
+    os.makedirs(DATA_DIR, exist_ok=True)
+    pristine = os.path.join(DATA_DIR, f'{size}-{profile}.db')
+    if not os.path.exists(pristine):
+        building = pristine + '.tmp'
+        build_db(building, SIZES[size], config=configs[profile])
+        # production собирает файл в режиме WAL: журнал переносится в основной файл,
+        # и файл переводится в DELETE, чтобы его можно было переименовать и копировать
+        # без -wal/-shm рядом; при открытии профиль снова включит WAL
+        conn = sqlite3.connect(building)
+        try:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            conn.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            conn.close()
+        os.replace(building, pristine)
+    remove_db(path)
+    shutil.copy(pristine, path)
+
+
+def remove_db(path):
+    for name in (path, path + '-wal', path + '-shm'):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def run(target, workload, requests, concurrency, warmup):
+    samples = {}
+    errors = {}
+    lock = threading.Lock()
+    remaining = [warmup + requests]
+
+    def worker():
+        send = target.session()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                measured = remaining[0] < requests
+                endpoint, method, path, body = workload.next()
+            start = time.perf_counter()
+            status, location = send(method, path, body)
+            elapsed = time.perf_counter() - start
+            with lock:
+                workload.record(method, path, status, location)
+                if not measured:
+                    continue
+                if status in OK_STATUSES:
+                    samples.setdefault(endpoint, []).append(elapsed)
+                else:
+                    errors[endpoint] = errors.get(endpoint, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, time.perf_counter() - start
+
+
+def summarize(samples, errors, elapsed):
+    endpoints = {}
+    for endpoint in sorted(set(samples) | set(errors)):
+        timings = sorted(samples.get(endpoint, []))
+        if len(timings) >= 2:
+            q = statistics.quantiles(timings, n=100, method='inclusive')
+            p50, p95, p99 = q[49], q[94], q[98]
+        else:
+            p50 = p95 = p99 = timings[0] if timings else None
+        endpoints[endpoint] = {
+            'requests': len(timings),
+            'errors': errors.get(endpoint, 0),
+            'rps': len(timings) / elapsed,
+            'p50_ms': p50 and p50 * 1000,
+            'p95_ms': p95 and p95 * 1000,
+            'p99_ms': p99 and p99 * 1000,
+        }
+    total = sum(len(timings) for timings in samples.values())
+    return {'rps': total / elapsed, 'seconds': elapsed, 'endpoints': endpoints}
+
+
+# p95 по немногим запросам - шум; у редких эндпоинтов сравнивается p50
+MIN_P95_SAMPLES = 50
+
+
+def spread(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {'median': statistics.median(values), 'spread': max(values) - min(values)}
+
+
+def aggregate(results):
+    # медиана и размах (max - min) каждой метрики по прогонам
+    endpoints = {}
+    for endpoint in sorted({endpoint for result in results for endpoint in result['endpoints']}):
+        rows = [result['endpoints'][endpoint] for result in results if endpoint in result['endpoints']]
+        endpoints[endpoint] = {
+            'requests': statistics.median(row['requests'] for row in rows),
+            'errors': max(row['errors'] for row in rows),
+            **{key: spread(row[key] for row in rows) for key in ('p50_ms', 'p95_ms', 'p99_ms')},
+        }
+    return {
+        'runs': len(results),
+        'rps': spread(result['rps'] for result in results),
+        'endpoints': endpoints,
+    }
+
+
+def report(result):
+    print(f"{'endpoint':<24}{'n':>7}{'err':>5}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}")
+    for endpoint, row in result['endpoints'].items():
+        cells = [
+            f"{row[key]['median']:9.2f} ±{row[key]['spread']:5.2f}" if row[key] else f"{'-':>16}"
+            for key in ('p50_ms', 'p95_ms', 'p99_ms')
+        ]
+        print(f"{endpoint:<24}{row['requests']:>7.0f}{row['errors']:>5}{''.join(cells)}")
+    print(f"total: {result['rps']['median']:.1f} ±{result['rps']['spread']:.1f} req/s, median of {result['runs']} runs")
+
+
+# регрессия: медиана хуже медианы базовой линии больше, чем на допуск; допуск - больший
+# из размахов между прогонами в базовой линии и сейчас, но не меньше tolerance от базовой
+# медианы и (для задержек) не меньше min_delta_ms
+def regressions(result, baseline, tolerance, min_delta_ms):
+    found = []
+    for endpoint, old in baseline['endpoints'].items():
+        new = result['endpoints'].get(endpoint)
+        if not new:
+            continue
+        key = 'p95_ms' if old['requests'] >= MIN_P95_SAMPLES else 'p50_ms'
+        if new[key] and old[key]:
+            allowed = max(old[key]['spread'], new[key]['spread'], old[key]['median'] * tolerance, min_delta_ms)
+            if new[key]['median'] - old[key]['median'] > allowed:
+                found.append(
+                    f"{endpoint}: {key[:3]} {old[key]['median']:.2f} -> {new[key]['median']:.2f} ms "
+                    f"(allowed +{allowed:.2f})"
+                )
+        if new['errors'] > old['errors']:
+            found.append(f"{endpoint}: errors {old['errors']} -> {new['errors']}")
+    old, new = baseline['rps'], result['rps']
+    allowed = max(old['spread'], new['spread'], old['median'] * tolerance)
+    if old['median'] - new['median'] > allowed:
+        found.append(f"total rps {old['median']:.1f} -> {new['median']:.1f} (allowed -{allowed:.1f})")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='replay .http workloads and compare with baselines')
+    parser.add_argument('--size', choices=SIZES, default='10k')
+    parser.add_argument('--mix', choices=MIXES, default='read-heavy')
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--profile', choices=configs, default='production')
+    parser.add_argument('--url', help='running server instead of the Flask test client')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the result as JSON')
+    parser.add_argument('--baseline', help='baseline JSON, default baselines/<size>-<mix>.json')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='smallest allowed relative change')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    runs = []
+    workdir = tempfile.mkdtemp()
+    try:
+        for number in range(1, args.runs + 1):
+            if args.url:
+                target = ServerTarget(args.url)
+            else:
+                from app import create_app, create_indexes, db
+                path = os.path.join(workdir, f'{args.size}.db')
+                prepare_db(args.size, args.profile, path)
+                app = create_app(configs[args.profile], SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+                # миграции до первого запроса, как gunicorn on_starting: сохранённый
+                # в .data файл мог быть собран до последних изменений схемы
+                with app.app_context():
+                    create_indexes()
+                target = TestClientTarget(app)
+            workload = Workload(args.mix, counts(SIZES[args.size]), args.seed)
+            samples, errors, elapsed = run(target, workload, args.requests, args.concurrency, args.warmup)
+            runs.append(summarize(samples, errors, elapsed))
+            if not args.url:
+                with target.app.app_context():
+                    db.engine.dispose()
+            print(f"run {number}/{args.runs}: {runs[-1]['rps']:.1f} req/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    result = aggregate(runs)
+    result['params'] = {
+        'size': args.size, 'mix': args.mix, 'requests': args.requests, 'runs': args.runs,
+        'concurrency': args.concurrency,
+        'profile': args.profile, 'target': args.url or 'test-client',
+        'python': platform.python_version(), 'machine': platform.machine(),
+    }
+    report(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f'{args.size}-{args.mix}.json')
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'baseline saved to {baseline_path}')
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            found = regressions(result, json.load(f), args.tolerance, args.min_delta_ms)
+        for line in found:
+            print(f'REGRESSION {line}')
+        if found:
+            sys.exit(1)
+        print(f'no regressions against {baseline_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/workloads.py
+
+# сценарии нагрузки из movies.http, directors.http и genres.http:
+# каждый запрос из файлов - шаблон, смесь задаёт вес метода;
+# id в пути подменяется случайным существующим, DELETE удаляет только созданное в этом прогоне
+
+import json
+import os
+import random
+import re
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HTTP_FILES = ('movies.http', 'directors.http', 'genres.http')
+
+MIXES = {
+    'read': {'GET': 1},
+    'read-heavy': {'GET': 90, 'POST': 3, 'PUT': 2, 'PATCH': 3, 'DELETE': 2},
+    # как в .http-файлах: каждый запрос с одинаковым весом
+    'crud': {'GET': 1, 'POST': 1, 'PUT': 1, 'PATCH': 1, 'DELETE': 1},
+}
+
+
+class Template:
+    def __init__(self, method, path, body):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.resource = path.strip('/').split('/')[0]
+        self.has_id = bool(re.search(r'/\d+$', path))
+
+    @property
+    def endpoint(self):
+        return f"{self.method} /{self.resource}/{'<id>' if self.has_id else ''}"
+
+
+def parse_http_file(path):
+    with open(path, encoding='utf-8') as f:
+        blocks = f.read().split('###')
+    for block in blocks:
+        lines = block.strip().splitlines()
+        if not lines:
+            continue
+        method, url = lines[0].split()[:2]
+        body_lines = lines[lines.index('') + 1:] if '' in lines else []
+        body = json.loads('\n'.join(body_lines)) if body_lines else None
+        yield Template(method, urlsplit(url).path, body)
+
+
+def load_templates(files=HTTP_FILES):
+    return [template for name in files for template in parse_http_file(os.path.join(ROOT, name))]
+
+
+class Workload:
+    def __init__(self, mix, sizes, seed=0, templates=None):
+        self.templates = templates or load_templates()
+        weights = MIXES[mix]
+        per_method = {}
+        for template in self.templates:
+            per_method[template.method] = per_method.get(template.method, 0) + 1
+        self.weights = [weights.get(t.method, 0) / per_method[t.method] for t in self.templates]
+        self.sizes = sizes
+        self.created = {resource: [] for resource in sizes}
+        self.rng = random.Random(seed)
+
+    def next(self):
+        # (endpoint, method, path, body)
+        while True:
+            template = self.rng.choices(self.templates, self.weights)[0]
+            path = template.path
+            if template.has_id:
+                if template.method == 'DELETE':
+                    created = self.created[template.resource]
+                    if not created:
+                        continue
+                    pk = created.pop(self.rng.randrange(len(created)))
+                else:
+                    pk = self.rng.randint(1, self.sizes[template.resource])
+                path = f'/{template.resource}/{pk}'
+            return template.endpoint, template.method, path, template.body
+
+    def record(self, method, path, status, location):
+        if method == 'POST' and status == 201 and location:
+            resource, pk = location.rstrip('/').split('/')[-2:]
+            if resource in self.created:
+                self.created[resource].append(int(pk))
@@ -0,0 +1,98 @@
+# coalescer.py
+
+# фоновый писатель: изменения из разных запросов копятся в очереди не дольше window
+# секунд и применяются одной транзакцией - у SQLite один писатель, и так на пачку
+# приходится одна блокировка и один commit вместо одного на запрос
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class WriteCoalescer:
+    def __init__(self, app, apply, window=0.005, max_batch=500):
+        self.app = app
+        self.apply = apply
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, mutations):
+        # mutations попадают в одну транзакцию; результат - список по одному на mutation
+        future = Future()
+        self._ensure_started()
+        self._queue.put((list(mutations), future))
+        return future
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_started(self):
+        # поток запускается при первой записи, уже внутри воркера, а не до fork,
+        # и перезапускается, если успел упасть
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='movie-writer', daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        items = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            if items is None:
+                return
+            # запросы, которые уже перестали ждать (future.cancel() по таймауту), не применяются
+            items = [item for item in items if item[1].set_running_or_notify_cancel()]
+            try:
+                self._apply(items)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _apply(self, items):
+        mutations = [mutation for item_mutations, _ in items for mutation in item_mutations]
+        try:
+            with self.app.app_context():
+                results = self.apply(mutations)
+        except Exception as e:
+            if len(items) == 1:
+                items[0][1].set_exception(e)
+                return
+            # одна ошибочная запись не должна отдавать 500 всем, кто попал в ту же пачку:
+            # пачка повторяется по запросу, и ошибку получает только виновник
+            for item in items:
+                self._apply([item])
+            return
+        start = 0
+        for item_mutations, future in items:
+            future.set_result(results[start:start + len(item_mutations)])
+            start += len(item_mutations)
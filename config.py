@@ -0,0 +1,80 @@
+# config.py
+
+# настройки приложения; профиль выбирается переменной окружения APP_ENV,
+# значения для production переопределяются переменными окружения
+
+import os
+
+from sqlalchemy.pool import QueuePool
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_flag(name, default=False):
+    return os.environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///test.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    RESTX_JSON = {'ensure_ascii': False}
+    # PRAGMA, выполняемые на каждом новом соединении с SQLite
+    SQLITE_PRAGMAS = {}
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_MAX_ENTRIES = env_int('CACHE_MAX_ENTRIES', 10_000)
+    CACHE_TTL = env_int('CACHE_TTL', 300)
+    # без CACHE_REDIS_URL кэш живёт в памяти процесса; при одном процессе это безопасно
+    CACHE_LOCAL = True
+    # замеры SQL, Server-Timing и /metrics
+    INSTRUMENTATION = env_flag('INSTRUMENTATION')
+    SLOW_QUERY_MS = env_int('SLOW_QUERY_MS', 100)
+    # PUT/PATCH фильмов через фонового писателя, одна транзакция на окно
+    WRITE_COALESCING = env_flag('WRITE_COALESCING')
+    WRITE_COALESCE_WINDOW_MS = env_int('WRITE_COALESCE_WINDOW_MS', 5)
+    WRITE_COALESCE_MAX_BATCH = env_int('WRITE_COALESCE_MAX_BATCH', 500)
+    # сколько запрос ждёт фонового писателя, прежде чем ответить 503
+    WRITE_COALESCE_TIMEOUT_MS = env_int('WRITE_COALESCE_TIMEOUT_MS', 10_000)
+    # индекс рейтингов: сколько лучших фильмов держать на жанр/режиссёра и сколько таких
+    # списков; RATING_INDEX_TOP_K=0 отключает индекс, и /movies/top читает SQL
+    RATING_INDEX_TOP_K = env_int('RATING_INDEX_TOP_K', 100)
+    RATING_INDEX_MAX_GROUPS = env_int('RATING_INDEX_MAX_GROUPS', 2000)
+
+
+class ProductionConfig(Config):
+    # пул держит соединения открытыми, чтобы PRAGMA не выполнялись на каждый запрос;
+    # соединение может перейти в другой поток, отсюда check_same_thread=False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': QueuePool,
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+        'connect_args': {
+            'check_same_thread': False,
+            'timeout': env_int('DB_BUSY_TIMEOUT_MS', 5000) / 1000,
+        },
+    }
+    # WAL: читатели не ждут писателя и друг друга; synchronous=NORMAL в режиме WAL
+    # не теряет целостность, fsync выполняется только при checkpoint
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': env_int('DB_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': env_int('DB_MMAP_SIZE', 256 * 1024 * 1024),
+        'cache_size': -env_int('DB_CACHE_SIZE_KB', 64 * 1024),
+    }
+    # воркеров несколько, а запись в одном не сбросит кэш в памяти остальных:
+    # без CACHE_REDIS_URL кэш ответов выключен, CACHE_LOCAL=1 - только для одного воркера
+    CACHE_LOCAL = env_flag('CACHE_LOCAL')
+
+
+configs = {
+    'development': Config,
+    'production': ProductionConfig,
+}
+
+
+def get_config():
+    return configs[os.environ.get('APP_ENV', 'development')]
@@ -1,44 +1,26 @@
 # create_data.py
 
-# чтобы создать БД с данными 
+# чтобы создать БД с данными:
+#   python create_data.py                      - пересоздать БД из data ниже
+#   python create_data.py movies.jsonl --append - дозагрузить файл .json/.jsonl
+#
+# .json - объект вида data ниже: {"directors": [...], "genres": [...], "movies": [...]}
+# .jsonl - по записи в строке, раздел указывается ключом "type":
+#   {"type": "movies", "pk": 1, "title": "...", ...}
+# файлы читаются потоково, по проходу на раздел: сначала режиссёры и жанры, потом фильмы
 
-from flask import Flask, request
-from flask_restx import Api, Resource
-from flask_sqlalchemy import SQLAlchemy
-from marshmallow import Schema, fields
+import argparse
+import json
+import time
+from contextlib import contextmanager
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+from app import (
+    BULK_BATCH_SIZE, Director, Genre, Movie, bulk_insert, create_app, db, derived_tables_suspended,
+)
 
+SECTIONS = (('directors', Director), ('genres', Genre), ('movies', Movie))
+CHUNK_SIZE = 1 << 16
 
-class Movie(db.Model):
-    __tablename__ = 'movie'
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(255))
-    description = db.Column(db.String(255))
-    trailer = db.Column(db.String(255))
-    year = db.Column(db.Integer)
-    rating = db.Column(db.Integer)
-    genre_id = db.Column(db.Integer, db.ForeignKey("genre.id"))
-    genre = db.relationship("Genre")
-    director_id = db.Column(db.Integer, db.ForeignKey("director.id"))
-    director = db.relationship("Director")
-
-
-class Director(db.Model):
-    __tablename__ = 'director'
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(255))
-
-class Genre(db.Model):
-    __tablename__ = 'genre'
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(255))
-
-db.drop_all()
-db.create_all()
 
 # -------------------------------------------------------
 data = {
@@ -244,32 +226,139 @@ data = {
 }
 # -------------------------------------------------------
 
-for movie in data["movies"]:
-    m = Movie(
-        id=movie["pk"],
-        title=movie["title"],
-        description=movie["description"],
-        trailer=movie["trailer"],
-        year=movie["year"],
-        rating=movie["rating"],
-        genre_id=movie["genre_id"],
-        director_id=movie["director_id"],
-    )
-    with db.session.begin():
-        db.session.add(m)
 
-for director in data["directors"]:
-    d = Director(
-        id=director["pk"],
-        name=director["name"],
-    )
-    with db.session.begin():
-        db.session.add(d)
+def iter_jsonl(path, section):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.pop('type', None) == section:
+                    yield record
+
+
+class _Reader:
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk)
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'expected {char!r} at offset {self.pos}')
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, self.pos = json.JSONDecoder().raw_decode(self.buf, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+
+
+def iter_json(path, section):
+    # {"раздел": [запись, ...], ...} разбирается по одной записи, без загрузки файла целиком
+    with open(path, encoding='utf-8') as f:
+        reader = _Reader(f)
+        reader.expect('{')
+        while reader.peek() != '}':
+            key = reader.value()
+            reader.expect(':')
+            reader.expect('[')
+            while reader.peek() != ']':
+                record = reader.value()
+                if key == section:
+                    yield record
+                if reader.peek() == ',':
+                    reader.pos += 1
+            reader.expect(']')
+            if reader.peek() == ',':
+                reader.pos += 1
+
+
+def iter_section(source, section):
+    if isinstance(source, dict):
+        return iter(source.get(section, []))
+    if source.endswith('.jsonl'):
+        return iter_jsonl(source, section)
+    return iter_json(source, section)
+
+
+def to_row(record):
+    row = dict(record)
+    if 'pk' in row:
+        row['id'] = row.pop('pk')
+    return row
+
+
+@contextmanager
+def load_pragmas(conn):
+    # на время загрузки журнал в памяти и без fsync; прежние значения возвращаются;
+    # WAL не трогаем - из него нельзя выйти, пока БД открыта другими процессами
+    journal_mode = conn.exec_driver_sql('PRAGMA journal_mode').scalar()
+    synchronous = conn.exec_driver_sql('PRAGMA synchronous').scalar()
+    if journal_mode != 'wal':
+        conn.exec_driver_sql('PRAGMA journal_mode = MEMORY')
+    conn.exec_driver_sql('PRAGMA synchronous = OFF')
+    conn.exec_driver_sql('PRAGMA cache_size = -65536')
+    try:
+        yield
+    finally:
+        conn.exec_driver_sql(f'PRAGMA journal_mode = {journal_mode}')
+        conn.exec_driver_sql(f'PRAGMA synchronous = {synchronous}')
+
+
+def load(sources, batch_size=BULK_BATCH_SIZE, report=print):
+    # sources - пути к .json/.jsonl или словари вида data; возвращает {раздел: число строк};
+    # вызывается внутри app.app_context()
+    db.create_all()
+    stats = {}
+    with db.engine.connect() as conn, load_pragmas(conn), derived_tables_suspended(conn):
+        for section, model in SECTIONS:
+            start = time.perf_counter()
+            count = 0
+            for source in sources:
+                rows = (to_row(record) for record in iter_section(source, section))
+                count += bulk_insert(model, rows, conn, batch_size)
+            elapsed = time.perf_counter() - start
+            stats[section] = count
+            if report:
+                report(f'{section}: {count} rows in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.0f} rows/s)')
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='load movies, directors and genres into the database')
+    parser.add_argument('paths', nargs='*', help='.json or .jsonl files; built-in data if omitted')
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument('--append', action='store_true', help='keep existing tables')
+    args = parser.parse_args()
+    with create_app().app_context():
+        if not args.append:
+            db.drop_all()
+        start = time.perf_counter()
+        stats = load(args.paths or [data], args.batch_size)
+        elapsed = time.perf_counter() - start
+    total = sum(stats.values())
+    print(f'total: {total} rows in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} rows/s)')
+
 
-for genre in data["genres"]:
-    d = Genre(
-        id=genre["pk"],
-        name=genre["name"],
-    )
-    with db.session.begin():
-        db.session.add(d)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
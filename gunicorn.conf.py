@@ -0,0 +1,33 @@
+# gunicorn.conf.py
+
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+# у SQLite один писатель, поэтому воркеры - процессы, а не потоки:
+# чтение масштабируется по ядрам, запись ограничена блокировкой файла
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+# соединения с SQLite открываются в каждом воркере после fork
+preload_app = False
+timeout = 30
+
+
+# схема, индексы и производные таблицы меняются один раз в мастере до запуска
+# воркеров, а не в каждом из них; соединения мастера закрываются до fork
+def on_starting(server):
+    from app import create_app, create_indexes, db
+
+    app = create_app()
+    with app.app_context():
+        create_indexes()
+        db.engine.dispose()
+
+
+# списки RatingIndex собираются в каждом воркере после загрузки приложения,
+# до первого запроса; соединения открываются уже после fork
+def post_worker_init(worker):
+    from app import warm_rating_index
+
+    with worker.wsgi.app_context():
+        warm_rating_index()
@@ -0,0 +1,185 @@
+# instrumentation.py
+
+# замеры запросов: число и время SQL на запрос, время сериализации marshmallow,
+# заголовок Server-Timing, журнал медленных запросов с EXPLAIN QUERY PLAN
+# и /metrics с гистограммами в текстовом формате Prometheus;
+# при INSTRUMENTATION=0 ничего из этого не подключается, кроме одной проверки в TimedSchema.dump
+
+import bisect
+import logging
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from marshmallow import Schema
+from sqlalchemy import event
+
+logger = logging.getLogger('movies.slow_query')
+
+# в журнал попадает не больше стольких символов параметров; у executemany - только число строк
+PARAMS_LOG_LIMIT = 500
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    __slots__ = ('start', 'queries', 'db', 'serialize')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+
+
+class TimedSchema(Schema):
+    def dump(self, obj, *, many=None):
+        timings = g.get('timings') if has_request_context() else None
+        if timings is None:
+            return super().dump(obj, many=many)
+        start = time.perf_counter()
+        try:
+            return super().dump(obj, many=many)
+        finally:
+            timings.serialize += time.perf_counter() - start
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                label = ','.join(f'{key}="{value}"' for key, value in labels)
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {cumulative}')
+                lines.append(f'{self.name}_sum{{{label}}} {total}')
+                lines.append(f'{self.name}_count{{{label}}} {cumulative}')
+        return lines
+
+
+class Metrics:
+    # у каждого воркера gunicorn свои счётчики; Prometheus опрашивает их по отдельности
+    def __init__(self):
+        self.latency = Histogram('http_request_duration_seconds', 'Request latency by route')
+        self.db_time = Histogram('http_request_db_seconds', 'SQL time per request by route')
+        self.queries = Histogram(
+            'http_request_db_queries', 'SQL statements per request by route',
+            buckets=(1, 2, 5, 10, 20, 50, 100),
+        )
+        self.slow_queries = 0
+
+    def render(self):
+        lines = self.latency.render() + self.db_time.render() + self.queries.render()
+        lines += [
+            '# HELP db_slow_queries_total Statements slower than SLOW_QUERY_MS',
+            '# TYPE db_slow_queries_total counter',
+            f'db_slow_queries_total {self.slow_queries}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def explain(cursor, statement, parameters):
+    # план строится отдельным курсором DBAPI, в обход событий SQLAlchemy
+    if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')):
+        return None
+    try:
+        plan = cursor.connection.cursor()
+        try:
+            plan.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+            return [row[-1] for row in plan.fetchall()]
+        finally:
+            plan.close()
+    except Exception as e:
+        return [f'explain failed: {e}']
+
+
+def describe_parameters(parameters, executemany):
+    if executemany:
+        return f'<{len(parameters)} rows>'
+    text = repr(parameters)
+    if len(text) > PARAMS_LOG_LIMIT:
+        return f'{text[:PARAMS_LOG_LIMIT]}... ({len(text)} chars)'
+    return text
+
+
+def init_instrumentation(app, engine):
+    metrics = app.extensions['metrics'] = Metrics()
+    slow_query = app.config['SLOW_QUERY_MS'] / 1000
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        timings = g.get('timings') if has_request_context() else None
+        if timings is not None:
+            timings.queries += 1
+            timings.db += elapsed
+        if elapsed >= slow_query:
+            metrics.slow_queries += 1
+            plan = None if executemany else explain(cursor, statement, parameters)
+            logger.warning(
+                'slow query %.1f ms: %s; params=%s; plan=%s',
+                elapsed * 1000, statement, describe_parameters(parameters, executemany), plan,
+            )
+
+    # если запрос упал, after_cursor_execute не вызывается и отметка осталась бы в conn.info
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get('query_start'):
+            conn.info['query_start'].pop()
+
+    @app.before_request
+    def start_timings():
+        g.timings = RequestTimings()
+
+    @app.after_request
+    def record_timings(response):
+        timings = g.pop('timings', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.start
+        labels = (
+            ('method', request.method),
+            ('route', request.url_rule.rule if request.url_rule else 'unmatched'),
+            ('status', str(response.status_code)),
+        )
+        metrics.latency.observe(labels, total)
+        metrics.db_time.observe(labels, timings.db)
+        metrics.queries.observe(labels, timings.queries)
+        # тело потокового ответа (/movies/export) пишется уже после after_request:
+        # замер покрыл бы только подготовку, поэтому Server-Timing для него не ставится
+        if response.is_streamed:
+            return response
+        app_time = max(total - timings.db - timings.serialize, 0.0)
+        response.headers['Server-Timing'] = ', '.join((
+            f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries"',
+            f'serialize;dur={timings.serialize * 1000:.2f}',
+            f'app;dur={app_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ))
+        return response
+
+    @app.route('/metrics')
+    def metrics_view():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,186 @@
+# ranking.py
+
+# индекс рейтингов в памяти: для всего каталога, каждого жанра и режиссёра - отсортированный
+# по (рейтинг по убыванию, без рейтинга - в конце, id) список не длиннее top_k, так что
+# «лучшие в жанре» и «ещё у режиссёра» - срез готового списка без SQL, а память ограничена
+# max_groups * top_k строками. Список всего каталога и жанров собирается при старте воркера,
+# режиссёров - при первом обращении; записи этого процесса применяются к спискам на месте.
+# Чужие записи (другие воркеры, create_data.py) видны по PRAGMA data_version и счётчику
+# movie_change_seq, который ведут триггеры на movie: если счётчик ушёл дальше, чем
+# насчитали свои записи, списки сбрасываются и перечитываются из базы
+
+import bisect
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('movies.ranking')
+
+FIELDS = ('id', 'title', 'year', 'rating', 'genre_id', 'director_id')
+
+
+def as_movie(row):
+    mid, title, year, rating, genre_id, director_id = row
+    return mid, title, year, None if rating is None else float(rating), genre_id, director_id
+
+
+def sort_key(movie):
+    mid, _, _, rating, _, _ = movie
+    return rating is None, -(rating or 0), mid
+
+
+def group_keys(movie):
+    keys = [(None, None)]
+    for name, index in (('genre_id', 4), ('director_id', 5)):
+        if movie[index] is not None:
+            keys.append((name, movie[index]))
+    return keys
+
+
+class Group:
+    # keys - верный префикс порядка группы; complete - в нём вся группа
+    __slots__ = ('keys', 'complete')
+
+    def __init__(self, keys, complete):
+        self.keys = keys
+        self.complete = complete
+
+
+class RatingIndex:
+    # load(name, value, limit) -> строки FIELDS в порядке sort_key
+    def __init__(self, load, database=None, top_k=100, max_groups=2000):
+        self.load = load
+        self.database = database
+        self.top_k = top_k
+        self.max_groups = max_groups
+        self._groups = OrderedDict()
+        self._movies = {}
+        self._version = None
+        self._seq = None
+        self._watch = None
+        # загрузка группы - чтение top_k строк по индексу, поэтому идёт под блокировкой:
+        # так её не обгонит применение записи, сделанной этим же процессом
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.database is not None and self.top_k > 0
+
+    def _sync(self):
+        # отдельное соединение, которое само ничего не пишет: data_version на нём меняется
+        # после commit любого другого соединения, в том числе нашего пула
+        if self._watch is None:
+            self._watch = sqlite3.connect(self.database, check_same_thread=False)
+        version = self._watch.execute('PRAGMA data_version').fetchone()[0]
+        if version == self._version:
+            return
+        self._version = version
+        seq = self._watch.execute('SELECT seq FROM movie_change_seq').fetchone()[0]
+        if seq != self._seq:
+            self._clear()
+            self._seq = seq
+
+    def _clear(self):
+        self._groups.clear()
+        self._movies.clear()
+
+    def _group(self, key, wanted):
+        group = self._groups.get(key)
+        if group is not None and (group.complete or len(group.keys) >= wanted):
+            self._groups.move_to_end(key)
+            return group
+        if group is not None:
+            self._drop(key)
+        rows = [as_movie(row) for row in self.load(*key, self.top_k)]
+        group = self._groups[key] = Group([sort_key(movie) for movie in rows], len(rows) < self.top_k)
+        for movie in rows:
+            self._movies.setdefault(movie[0], (movie, set()))[1].add(key)
+        while len(self._groups) > self.max_groups:
+            self._drop(next(iter(self._groups)))
+        return group
+
+    def _drop(self, key):
+        for item in self._groups.pop(key).keys:
+            self._forget(item[2], key)
+
+    def _forget(self, mid, key):
+        _, keys = self._movies[mid]
+        keys.discard(key)
+        if not keys:
+            del self._movies[mid]
+
+    def _remove(self, mid):
+        movie, keys = self._movies.pop(mid, (None, ()))
+        for key in keys:
+            group = self._groups[key]
+            del group.keys[bisect.bisect_left(group.keys, sort_key(movie))]
+
+    def _insert(self, movie):
+        item = sort_key(movie)
+        for key in group_keys(movie):
+            group = self._groups.get(key)
+            # за пределами известного префикса неполной группы место фильма неизвестно
+            if group is None or not group.complete and (not group.keys or item > group.keys[-1]):
+                continue
+            bisect.insort(group.keys, item)
+            self._movies.setdefault(movie[0], (movie, set()))[1].add(key)
+            if len(group.keys) > self.top_k:
+                self._forget(group.keys.pop()[2], key)
+                group.complete = False
+
+    def warm(self, genre_ids):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._sync()
+            for key in [(None, None)] + [('genre_id', genre_id) for genre_id in genre_ids]:
+                self._group(key, 0)
+
+    def apply(self, seq, changed, ids, rows):
+        # запись этого процесса: seq - счётчик сразу после её commit, changed - сколько
+        # строк movie она изменила, rows - новые значения ids (удалённых среди них нет)
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._seq is None or seq <= self._seq:
+                return
+            if self._seq + changed != seq:
+                # между прошлой сверкой и этой записью была чужая
+                self._clear()
+                self._seq = seq
+                return
+            self._seq = seq
+            try:
+                movies = {movie[0]: movie for movie in map(as_movie, rows)}
+                for mid in ids:
+                    self._remove(mid)
+                    if mid in movies:
+                        self._insert(movies[mid])
+            except Exception:
+                logger.exception('rating index update failed, dropping cached lists')
+                self._clear()
+
+    def get(self, mid):
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._sync()
+            movie = self._movies.get(mid)
+            return dict(zip(FIELDS, movie[0])) if movie else None
+
+    def top(self, name=None, value=None, limit=10, exclude=()):
+        wanted = limit + len(exclude)
+        if not self.enabled or wanted > self.top_k:
+            # глубже top_k - прямо из SQL
+            rows = [as_movie(row) for row in self.load(name, value, wanted)]
+            return [dict(zip(FIELDS, movie)) for movie in rows if movie[0] not in exclude][:limit]
+        result = []
+        with self._lock:
+            self._sync()
+            for item in self._group((name, value), wanted).keys:
+                if item[2] not in exclude:
+                    result.append(dict(zip(FIELDS, self._movies[item[2]][0])))
+                    if len(result) == limit:
+                        break
+        return result
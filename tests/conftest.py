@@ -0,0 +1,35 @@
+# tests/conftest.py
+
+# каждый тест получает своё приложение поверх временной SQLite с синтетическим каталогом;
+# тесты с меткой slow (миллионы строк) запускаются только с --runslow
+
+import pytest
+
+from app import create_app, create_indexes
+from benchmarks.generate import catalog
+from config import Config
+from create_data import load
+
+
+def pytest_addoption(parser):
+    parser.addoption('--runslow', action='store_true', help='run tests marked slow')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--runslow'):
+        return
+    skip = pytest.mark.skip(reason='needs --runslow')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    def make(movies, **overrides):
+        app = create_app(Config, SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "movies.db"}', **overrides)
+        with app.app_context():
+            load([catalog(movies)], report=None)
+            create_indexes()
+        return app
+    return make
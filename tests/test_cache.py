@@ -0,0 +1,45 @@
+# tests/test_cache.py
+
+# запись через API сбрасывает закэшированные ответы, в том числе по любому написанию ?embed=
+
+import pytest
+
+EMBEDS = ['', 'director', 'genre', 'director,genre', 'genre,director', 'director,director', 'genre,,genre']
+
+
+def read(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response
+
+
+def assert_fresh(client, url, stale, check):
+    response = client.get(url, headers={'If-None-Match': stale.headers['ETag']})
+    assert response.status_code == 200
+    check(response.json)
+
+
+@pytest.mark.parametrize('embed', EMBEDS)
+def test_movie_write_invalidates_every_embed_spelling(make_app, embed):
+    client = make_app(50).test_client()
+    url = f'/movies/1?embed={embed}'
+    stale = read(client, url)
+    assert client.patch('/movies/1', json={'title': 'NEW'}).status_code == 204
+    assert_fresh(client, url, stale, lambda movie: movie['title'] == 'NEW' or pytest.fail(movie))
+
+
+@pytest.mark.parametrize('name', ['director', 'genre'])
+@pytest.mark.parametrize('embed', EMBEDS)
+def test_rename_invalidates_embedding_movies(make_app, name, embed):
+    client = make_app(50).test_client()
+    pk = read(client, '/movies/1').json[f'{name}_id']
+    urls = [f'/movies/1?embed={embed}', f'/{name}s/{pk}', f'/{name}s/']
+    stale = [read(client, url) for url in urls]
+    assert client.patch(f'/{name}s/{pk}', json={'name': 'NEW'}).status_code == 204
+
+    if name in embed:
+        assert_fresh(client, urls[0], stale[0], lambda movie: movie[name]['name'] == 'NEW' or pytest.fail(movie))
+    assert_fresh(client, urls[1], stale[1], lambda item: item['name'] == 'NEW' or pytest.fail(item))
+    assert_fresh(client, urls[2], stale[2], lambda items: any(
+        item['id'] == pk and item['name'] == 'NEW' for item in items
+    ) or pytest.fail('renamed item not listed'))
@@ -0,0 +1,35 @@
+# tests/test_embed.py
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+
+MOVIES = 1_500
+
+
+def count_statements(app, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            response = app.test_client().get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements), response.json
+
+
+@pytest.mark.parametrize('embed', ['director', 'genre', 'director,genre'])
+def test_embed_statement_count_does_not_depend_on_page_size(make_app, embed):
+    app = make_app(MOVIES)
+    one, page = count_statements(app, f'/movies/?embed={embed}&limit=1')
+    many, page = count_statements(app, f'/movies/?embed={embed}&limit=1000')
+    assert len(page) == 1000
+    assert one == many
+    for name in embed.split(','):
+        assert all(movie[name]['id'] == movie[f'{name}_id'] for movie in page)
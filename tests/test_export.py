@@ -0,0 +1,41 @@
+# tests/test_export.py
+
+# /movies/export отдаёт таблицу потоком: пик памяти под tracemalloc ограничен
+# размером пачки yield_per и не растёт вместе с таблицей
+
+import tracemalloc
+
+import pytest
+
+PEAK_CEILING = 10 * 1024 * 1024
+
+
+def export(app, fmt):
+    client = app.test_client()
+    tracemalloc.start()
+    try:
+        response = client.get(f'/movies/export?format={fmt}', buffered=False)
+        assert response.status_code == 200
+        size = lines = 0
+        for chunk in response.response:
+            size += len(chunk)
+            lines += chunk.count('\n') if isinstance(chunk, str) else chunk.count(b'\n')
+        response.close()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return lines, size, peak
+
+
+@pytest.mark.parametrize('rows', [
+    40_000,
+    pytest.param(2_000_000, marks=pytest.mark.slow),
+])
+def test_export_peak_memory_is_bounded(make_app, rows):
+    app = make_app(rows)
+    for fmt, header in (('ndjson', 0), ('csv', 1)):
+        lines, size, peak = export(app, fmt)
+        assert lines == rows + header
+        # выгрузка целиком в памяти не уложилась бы в потолок
+        assert size > 2 * PEAK_CEILING
+        assert peak < PEAK_CEILING, f'{fmt}: peak {peak} bytes'
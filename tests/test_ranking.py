@@ -0,0 +1,93 @@
+# tests/test_ranking.py
+
+# /movies/top и /related из RatingIndex совпадают с тем же запросом без индекса
+# (RATING_INDEX_TOP_K=0) после записей этого процесса и чужих; свои записи и правки
+# режиссёров/жанров списки не сбрасывают
+
+import pytest
+
+from app import create_app, warm_rating_index
+from config import Config
+
+TOP_K = 5
+
+
+@pytest.fixture
+def apps(make_app):
+    indexed = make_app(300, RATING_INDEX_TOP_K=TOP_K)
+    with indexed.app_context():
+        warm_rating_index()
+    plain = create_app(Config, SQLALCHEMY_DATABASE_URI=indexed.config['SQLALCHEMY_DATABASE_URI'],
+                       RATING_INDEX_TOP_K=0)
+    return indexed, plain
+
+
+def urls(client):
+    genres = [genre['id'] for genre in client.get('/genres/').json]
+    result = [f'/movies/top?limit={limit}' for limit in (1, TOP_K, TOP_K + 3)]
+    result += [f'/movies/top?genre_id={gid}&limit={limit}' for gid in genres for limit in (2, TOP_K)]
+    result += [f'/movies/{mid}/related?limit={limit}' for mid in (1, 2, 150, 299) for limit in (3, TOP_K)]
+    return result
+
+
+def assert_same(indexed, plain):
+    client, expected = indexed.test_client(), plain.test_client()
+    for url in urls(expected):
+        assert client.get(url).json == expected.get(url).json, url
+
+
+def cached_groups(app):
+    return set(app.extensions['rating_index']._groups)
+
+
+def top_id(client, url='/movies/top?limit=1'):
+    return client.get(url).json[0]['id']
+
+
+def test_own_writes_update_lists_in_place(apps):
+    indexed, plain = apps
+    client = indexed.test_client()
+    assert_same(indexed, plain)
+    warmed = cached_groups(indexed)
+
+    movie = client.get('/movies/7').json
+    assert client.post('/movies/', json={
+        'title': 'NEW', 'year': 2000, 'rating': 10.0,
+        'genre_id': movie['genre_id'], 'director_id': movie['director_id'],
+    }).status_code == 201
+    assert client.patch(f'/movies/{top_id(client)}', json={'rating': 0.5}).status_code == 204
+    assert client.put('/movies/7', json={**{k: movie[k] for k in (
+        'title', 'description', 'trailer', 'year', 'genre_id', 'director_id')}, 'rating': 9.9}).status_code == 204
+    assert client.patch('/movies/', json=[
+        {'id': 150, 'rating': 9.95}, {'id': 2, 'genre_id': movie['genre_id']}, {'id': 3, 'rating': 1.0},
+    ]).status_code == 200
+    assert client.delete(f'/movies/{top_id(client)}').status_code == 204
+    assert client.post('/movies/bulk', json=[
+        {'title': f'BULK {i}', 'year': 2001, 'rating': 9.0 + i / 10, 'genre_id': movie['genre_id']}
+        for i in range(3)
+    ]).status_code == 201
+
+    assert warmed <= cached_groups(indexed)
+    assert_same(indexed, plain)
+
+
+@pytest.mark.parametrize('name', ['director', 'genre'])
+def test_rename_keeps_lists(apps, name):
+    indexed, plain = apps
+    client = indexed.test_client()
+    assert_same(indexed, plain)
+    warmed = cached_groups(indexed)
+    pk = client.get('/movies/1').json[f'{name}_id']
+    assert client.patch(f'/{name}s/{pk}', json={'name': 'NEW'}).status_code == 204
+    assert warmed <= cached_groups(indexed)
+    assert_same(indexed, plain)
+
+
+def test_foreign_write_reloads_lists(apps):
+    indexed, plain = apps
+    client = indexed.test_client()
+    assert_same(indexed, plain)
+    loser = top_id(client)
+    assert plain.test_client().patch(f'/movies/{loser}', json={'rating': 0.5}).status_code == 204
+    assert top_id(client) != loser
+    assert_same(indexed, plain)
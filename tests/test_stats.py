@@ -0,0 +1,82 @@
+# tests/test_stats.py
+
+# сводка movie_stats, которую ведут триггеры, совпадает с GROUP BY по movie
+# после любых изменений фильмов
+
+import pytest
+
+from app import STATS_DIMENSIONS, Movie, db, live_movie_stats, movie_stats
+
+
+def assert_summary_matches(app):
+    with app.app_context():
+        for column in STATS_DIMENSIONS.values():
+            summary, live = movie_stats(column), live_movie_stats(column)
+            assert [row[column] for row in summary] == [row[column] for row in live], column
+            for got, expected in zip(summary, live):
+                assert got['avg_rating'] == pytest.approx(expected['avg_rating'], abs=0.011), (column, got)
+                assert {**got, 'avg_rating': None} == {**expected, 'avg_rating': None}, column
+
+
+def extreme(app, column, value, order):
+    with app.app_context():
+        return Movie.query.filter(getattr(Movie, column) == value, Movie.rating.isnot(None)) \
+            .order_by(order(Movie.rating), Movie.id).first().id
+
+
+def test_summary_follows_every_kind_of_write(make_app):
+    app = make_app(300)
+    client = app.test_client()
+    assert_summary_matches(app)
+
+    # вставка; API рейтинг без значения не принимает, такой фильм пишется напрямую
+    movie = {'title': 'new', 'year': 1990, 'genre_id': 2, 'director_id': 3, 'rating': 9.5}
+    assert client.post('/movies/', json=movie).status_code == 201
+    with app.app_context():
+        db.session.add(Movie(**{**movie, 'rating': None}))
+        db.session.commit()
+    assert_summary_matches(app)
+
+    # рейтинг крайнего фильма группы: min и max пересчитываются
+    for column, value in (('genre_id', 1), ('director_id', 3), ('year', 1990)):
+        lowest = extreme(app, column, value, lambda c: c.asc())
+        highest = extreme(app, column, value, lambda c: c.desc())
+        assert client.patch(f'/movies/{lowest}', json={'rating': 5.5}).status_code == 204
+        assert client.patch(f'/movies/{highest}', json={'rating': 5.4}).status_code == 204
+        assert_summary_matches(app)
+
+    # переезд в другой жанр, год и к другому режиссёру, одиночный и пакетный
+    assert client.patch('/movies/5', json={'genre_id': 4, 'year': 1955}).status_code == 204
+    response = client.patch('/movies/', json=[
+        {'id': 6, 'director_id': 7, 'rating': 1.0},
+        {'id': 7, 'year': 2001, 'genre_id': 1},
+    ])
+    assert [item['status'] for item in response.json] == [204, 204]
+    assert_summary_matches(app)
+
+    # удаление последнего фильма группы убирает группу
+    lonely = {'title': 'lonely', 'year': 1800, 'genre_id': 1, 'director_id': 1, 'rating': 7.0}
+    location = client.post('/movies/', json=lonely).headers['Location']
+    assert_summary_matches(app)
+    assert client.delete(location).status_code == 204
+    assert_summary_matches(app)
+    with app.app_context():
+        assert 1800 not in [row['year'] for row in movie_stats('year')]
+
+    # пакетная вставка через /movies/bulk
+    rows = [
+        {'title': f'bulk {n}', 'year': 1900 + n % 5, 'genre_id': 1 + n % 3, 'director_id': 1 + n % 4,
+         'rating': n % 10 + 0.5}
+        for n in range(200)
+    ]
+    assert client.post('/movies/bulk', json=rows).status_code == 201
+    assert_summary_matches(app)
+
+    # удаление всего подряд до пустой таблицы
+    with app.app_context():
+        ids = [mid for (mid,) in db.session.query(Movie.id).filter(Movie.year == 1990)]
+    for mid in ids:
+        assert client.delete(f'/movies/{mid}').status_code == 204
+    assert_summary_matches(app)
+    with app.app_context():
+        assert 1990 not in [row['year'] for row in movie_stats('year')]
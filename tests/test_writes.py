@@ -0,0 +1,54 @@
+# tests/test_writes.py
+
+# PUT/PATCH фильмов: проверка входных данных и запись через фонового писателя
+
+import threading
+
+import pytest
+
+from app import Movie
+
+
+@pytest.mark.parametrize('item', [
+    {'id': True, 'rating': 3},
+    {'id': 1, 'version': True, 'rating': 3},
+    {'id': '1', 'rating': 3},
+])
+def test_batch_patch_rejects_non_integer_id_and_version(make_app, item):
+    client = make_app(10).test_client()
+    before = client.get('/movies/1').json
+    assert client.patch('/movies/', json=[item]).status_code == 400
+    assert client.get('/movies/1').json == before
+
+
+def test_patch_rejects_boolean_version(make_app):
+    client = make_app(10).test_client()
+    assert client.patch('/movies/1', json={'version': False, 'rating': 3}).status_code == 400
+
+
+def test_failed_invalidation_does_not_reapply_a_coalesced_batch(make_app):
+    app = make_app(10, WRITE_COALESCING=True, WRITE_COALESCE_WINDOW_MS=200)
+
+    def unavailable(*keys):
+        raise ConnectionError('cache is down')
+    app.extensions['response_cache'].delete = unavailable
+
+    statuses = {}
+
+    def patch(mid, payload):
+        statuses[mid] = app.test_client().patch(f'/movies/{mid}', json=payload).status_code
+
+    # одна запись с ожидаемой версией, другая без: обе попадают в одну пачку
+    threads = [
+        threading.Thread(target=patch, args=(1, {'version': 1, 'rating': 2.5})),
+        threading.Thread(target=patch, args=(2, {'rating': 2.5})),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    app.extensions['movie_writer'].close()
+    # изменения записаны один раз; повтор пачки дал бы 409 первому и вторую версию второму
+    assert 409 not in statuses.values()
+    with app.app_context():
+        assert {movie.id: movie.version for movie in Movie.query.filter(Movie.id.in_((1, 2)))} == {1: 2, 2: 2}
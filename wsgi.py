@@ -0,0 +1,13 @@
+# wsgi.py
+
+# точка входа для нескольких процессов:
+#   APP_ENV=production gunicorn -c gunicorn.conf.py wsgi:app
+# индексы создаёт хук on_starting в gunicorn.conf.py; без gunicorn - отдельной командой:
+#   FLASK_APP=wsgi flask create-indexes
+# в production SQLite работает в режиме WAL, так что воркеры читают параллельно,
+# а записи выстраиваются в очередь с ожиданием до DB_BUSY_TIMEOUT_MS;
+# кэш ответов в production общий (CACHE_REDIS_URL) или выключен, см. ProductionConfig
+
+from app import create_app
+
+app = create_app()